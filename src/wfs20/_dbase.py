@@ -1,12 +1,13 @@
 from wfs20 import __path__
-from wfs20.io import GDAL_INSTALLED
 
 import os
 import sys
 import sqlite3
+import importlib.util
 from pathlib import Path
 
-if GDAL_INSTALLED:
+# Not taken from wfs20.io, which (indirectly) imports this module
+if importlib.util.find_spec("osgeo"):
 	from osgeo import osr
 
 # 0,5,6 are hard to define.
@@ -0,0 +1,412 @@
+from wfs20.request import GetResponse
+
+import io
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Compression level of cached responses, a balance between speed and size
+_COMPRESSLEVEL = 6
+# Age (s) after which the partial copy of an abandoned response is removed
+_TMPAGE = 3600
+
+class _CacheTee:
+	def __init__(self, cache, key, source):
+		"""File-like object copying what is read from a source into the cache
+		"""
+
+		self._Cache = cache
+		self._Key = key
+		self._Source = source
+		self._File = cache._File(key)
+		self._Tmp = Path(f"{self._File}.{os.getpid()}.{threading.get_ident()}.tmp")
+		self._Dst = gzip.open(self._Tmp, "wb", compresslevel=_COMPRESSLEVEL)
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def read(self, size=-1):
+		chunk = self._Source.read(size)
+		if self._Dst is None:
+			return chunk
+		if not chunk:
+			self._Dst.close()
+			self._Dst = None
+			try:
+				os.replace(self._Tmp, self._File)
+			except FileNotFoundError:
+				# The cache was cleared while reading
+				return chunk
+			self._Cache._Evict(self._Key)
+		else:
+			self._Dst.write(chunk)
+			if self._Dst.fileobj.tell() > self._Cache.MaxSize:
+				self._Discard()
+		return chunk
+
+	def _Discard(self):
+		"""Stop copying and remove the partial copy
+		"""
+
+		self._Dst.close()
+		self._Dst = None
+		self._Tmp.unlink(missing_ok=True)
+
+	def close(self):
+		"""Close the source, an incomplete copy is discarded
+		"""
+
+		try:
+			if self._Dst is not None:
+				self._Discard()
+		finally:
+			self._Source.close()
+
+def _CacheDir(path=None):
+	"""Directory of the wfs20 cache
+
+	Either the given path, the WFS20_CACHE environment variable
+	or ~/.cache/wfs20
+	"""
+
+	if path is not None:
+		return Path(path)
+	if os.environ.get("WFS20_CACHE"):
+		return Path(os.environ["WFS20_CACHE"])
+	return Path(Path.home(),".cache","wfs20")
+
+def _CacheKey(*parts):
+	"""Hash of the parts that identify a cached item
+	"""
+
+	h = hashlib.sha256()
+	for part in parts:
+		if part is None:
+			part = b""
+		if isinstance(part, str):
+			part = part.encode()
+		h.update(part)
+		h.update(b"\0")
+	return h.hexdigest()
+
+def _WriteAtomic(path, content):
+	"""Write a file so that readers never see it half written
+	"""
+
+	tmp = Path(f"{path}.{os.getpid()}.{threading.get_ident()}.tmp")
+	tmp.write_bytes(content)
+	os.replace(tmp, path)
+
+class CapabilitiesCache:
+	def __init__(
+		self,
+		path: str=None,
+		ttl: float=86400,
+	):
+		"""On disk cache of GetCapabilities documents
+
+		A cached document is used as is while it is younger than ttl.
+		After that it is revalidated with the service through the ETag
+		and Last-Modified headers, so it is only downloaded again when
+		it has changed.
+
+		Parameters
+		----------
+		path : str, optional
+			Directory of the cache, see wfs20.cache._CacheDir for the default
+		ttl : float, optional
+			Time in seconds a cached document is used without revalidation
+		"""
+
+		self.Path = Path(_CacheDir(path),"capabilities")
+		self.TTL = ttl
+
+	def __repr__(self):
+		return f"<wfs20.cache.CapabilitiesCache object ({self.Path})>"
+
+	def Get(
+		self,
+		url: str,
+		timeout: 'float | tuple',
+		session: 'requests.Session'=None,
+		retry: 'wfs20.request.RetryPolicy'=None,
+	) -> bytes:
+		"""Return the GetCapabilities document of a service
+
+		Parameters
+		----------
+		url : str
+			GetCapabilities url of the service
+		timeout : float or tuple
+			Allowed timeout after which an Exception is raised
+		session : requests.Session, optional
+			Session used for the request
+		retry : wfs20.request.RetryPolicy, optional
+			Policy for retrying a failed request
+
+		Returns
+		-------
+		bytes
+			GetCapabilities document
+		"""
+
+		key = _CacheKey(url)
+		doc = Path(self.Path,f"{key}.xml")
+		meta = Path(self.Path,f"{key}.json")
+		headers = {}
+		m = None
+		if doc.exists() and meta.exists():
+			m = json.loads(meta.read_text())
+			if time.time() - m["time"] < self.TTL:
+				return doc.read_bytes()
+			if m.get("etag"):
+				headers["If-None-Match"] = m["etag"]
+			if m.get("last-modified"):
+				headers["If-Modified-Since"] = m["last-modified"]
+
+		r = GetResponse(url, timeout=timeout, session=session, headers=headers, retry=retry)
+		self.Path.mkdir(parents=True, exist_ok=True)
+		if r.status_code == 304 and m is not None:
+			m["time"] = time.time()
+			_WriteAtomic(meta, json.dumps(m).encode())
+			return doc.read_bytes()
+		m = {
+			"url": url,
+			"time": time.time(),
+			"etag": r.headers.get("ETag"),
+			"last-modified": r.headers.get("Last-Modified"),
+		}
+		_WriteAtomic(doc, r.content)
+		_WriteAtomic(meta, json.dumps(m).encode())
+		return r.content
+
+	def Clear(self):
+		"""Remove all cached documents
+		"""
+
+		if not self.Path.exists():
+			return
+		for f in self.Path.iterdir():
+			f.unlink()
+
+class ResponseCache:
+	def __init__(
+		self,
+		path: str=None,
+		maxsize: int=2**30,
+		maxitems: int=16,
+	):
+		"""Cache of GetFeature responses
+
+		Responses are stored gzip compressed under a hash of the request
+		(method, url and post data). Recently used responses are also
+		kept in memory, the store on disk is limited in size by evicting
+		the least recently used responses.
+
+		Parameters
+		----------
+		path : str, optional
+			Directory of the cache, see wfs20.cache._CacheDir for the default
+		maxsize : int, optional
+			Maximum size in bytes of the (compressed) responses on disk
+		maxitems : int, optional
+			Number of (compressed) responses kept in memory
+		"""
+
+		self.Path = Path(_CacheDir(path),"responses")
+		self.MaxSize = maxsize
+		self.MaxItems = maxitems
+		self._Memory = OrderedDict()
+		self._Lock = threading.Lock()
+
+	def __repr__(self):
+		return f"<wfs20.cache.ResponseCache object ({self.Path})>"
+
+	@staticmethod
+	def Key(
+		url: str,
+		method: str="GET",
+		data: str=None,
+	) -> str:
+		"""Key of a request
+
+		Parameters
+		----------
+		url : str
+			Request url, e.g. created by wfs20.request.CreateGetRequest
+		method : str, optional
+			Request method, either 'GET' or 'POST'
+		data : str, optional
+			Post data, e.g. created by wfs20.request.CreatePostRequest
+
+		Returns
+		-------
+		str
+		"""
+
+		return _CacheKey(method.upper(), url, data)
+
+	def _File(self, key):
+		return Path(self.Path,f"{key}.gml.gz")
+
+	def _Remember(self, key, blob):
+		"""Keep a compressed response in memory
+		"""
+
+		with self._Lock:
+			self._Memory[key] = blob
+			self._Memory.move_to_end(key)
+			while len(self._Memory) > self.MaxItems:
+				self._Memory.popitem(last=False)
+
+	def _Recall(self, key):
+		"""Compressed response from memory or disk, None if not cached
+		"""
+
+		with self._Lock:
+			if key in self._Memory:
+				self._Memory.move_to_end(key)
+				return self._Memory[key]
+		f = self._File(key)
+		try:
+			blob = f.read_bytes()
+			os.utime(f)
+		except FileNotFoundError:
+			return None
+		self._Remember(key, blob)
+		return blob
+
+	def _Evict(self, keep=None):
+		"""Remove the least recently used responses until the cache fits
+
+		The response of key keep (just added) is never removed. Partial
+		copies of responses that were never read completely (e.g. an
+		abandoned stream) are removed once older than _TMPAGE.
+		"""
+
+		now = time.time()
+		for f in self.Path.glob("*.gml.gz.*.tmp"):
+			try:
+				if now - f.stat().st_mtime > _TMPAGE:
+					f.unlink()
+			except OSError:
+				continue
+		keep = None if keep is None else self._File(keep)
+		files = []
+		for f in self.Path.glob("*.gml.gz"):
+			try:
+				st = f.stat()
+			except FileNotFoundError:
+				continue
+			files.append((st.st_mtime, st.st_size, f))
+		total = sum(item[1] for item in files)
+		for _, size, f in sorted(files, key=lambda item: item[0]):
+			if total <= self.MaxSize:
+				break
+			if f == keep:
+				continue
+			f.unlink(missing_ok=True)
+			total -= size
+
+	def Get(
+		self,
+		key: str,
+	) -> bytes:
+		"""Return a cached response, None when not cached
+		"""
+
+		blob = self._Recall(key)
+		if blob is None:
+			return None
+		return gzip.decompress(blob)
+
+	def Open(
+		self,
+		key: str,
+	):
+		"""Return a cached response as file-like object, None when not cached
+
+		Responses on disk are decompressed while reading, so they can be
+		parsed incrementally.
+		"""
+
+		with self._Lock:
+			blob = self._Memory.get(key)
+		if blob is not None:
+			return gzip.GzipFile(fileobj=io.BytesIO(blob))
+		f = self._File(key)
+		try:
+			os.utime(f)
+			return gzip.open(f,"rb")
+		except FileNotFoundError:
+			return None
+
+	def Put(
+		self,
+		key: str,
+		content: bytes,
+	):
+		"""Add a response to the cache
+		"""
+
+		blob = gzip.compress(content, compresslevel=_COMPRESSLEVEL)
+		self._Remember(key, blob)
+		# Responses larger than the whole cache are only kept in memory
+		if len(blob) > self.MaxSize:
+			return
+		self.Path.mkdir(parents=True, exist_ok=True)
+		_WriteAtomic(self._File(key), blob)
+		self._Evict(key)
+
+	def Fetch(
+		self,
+		key: str,
+		source,
+	):
+		"""Copy a response from a file-like object into the cache while it is read
+
+		The returned object reads from the source and writes every chunk
+		to disk, so the response can be parsed while it is downloaded and
+		is never held in memory as a whole. The response is only added to
+		the cache once the source is read completely, and not at all when
+		it turns out larger than the cache.
+
+		Returns
+		-------
+		file-like object of the response
+		"""
+
+		self.Path.mkdir(parents=True, exist_ok=True)
+		return _CacheTee(self, key, source)
+
+	def Remove(
+		self,
+		key: str,
+	):
+		"""Remove a response from the cache
+		"""
+
+		with self._Lock:
+			self._Memory.pop(key, None)
+		self._File(key).unlink(missing_ok=True)
+
+	def Clear(self):
+		"""Remove all cached responses, including partial copies
+		"""
+
+		with self._Lock:
+			self._Memory.clear()
+		if not self.Path.exists():
+			return
+		for f in self.Path.glob("*.gml.gz"):
+			f.unlink(missing_ok=True)
+		for f in self.Path.glob("*.gml.gz.*.tmp"):
+			try:
+				f.unlink()
+			except OSError:
+				continue
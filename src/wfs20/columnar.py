@@ -0,0 +1,204 @@
+from wfs20.error import WFSInternalError
+from wfs20.util import _ParseValue
+
+import datetime
+import warnings
+from array import array
+
+NUMPY_INSTALLED = False
+ARROW_INSTALLED = False
+
+try:
+	import numpy as np
+	_ColumnTypes = {
+	bool:np.bool_,
+	int:np.int64,
+	float:np.float64,
+	datetime.date:"datetime64[D]",
+	datetime.datetime:"datetime64[us]",
+	str:object,
+	}
+	_ColumnFill = {
+	bool:False,
+	int:0,
+	float:np.nan,
+	datetime.date:np.datetime64("NaT"),
+	datetime.datetime:np.datetime64("NaT"),
+	}
+	NUMPY_INSTALLED = True
+except ModuleNotFoundError:
+	warnings.warn("numpy package not installed. Columnar feature tables are not available.",ImportWarning)
+
+try:
+	import pyarrow as pa
+	ARROW_INSTALLED = True
+except ModuleNotFoundError:
+	pass
+
+def _ToValue(v, t):
+	"""Value of a field as numpy compatible object, None when missing or invalid
+	"""
+
+	if v is None:
+		return None
+	v = _ParseValue(v, t)
+	# numpy has no timezones, aware datetimes are stored in UTC
+	if t is datetime.datetime and v is not None and v.tzinfo is not None:
+		v = v.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return v
+
+def _Column(values, t):
+	"""Typed array and validity mask of raw (string) values
+	"""
+
+	if t == str:
+		column = np.empty(len(values), dtype=object)
+		column[:] = values
+		valid = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+		return column, valid
+	values = [_ToValue(v, t) for v in values]
+	valid = np.fromiter((v is not None for v in values), dtype=bool, count=len(values))
+	fill = _ColumnFill[t]
+	column = np.array(
+		[fill if v is None else v for v in values], dtype=_ColumnTypes[t]
+		)
+	return column, valid
+
+class FeatureTable:
+	def __init__(
+		self,
+		features,
+		layermeta: 'wfs20.util.LayerMeta',
+	):
+		"""Columnar container of features
+
+		The attributes are held in one typed array per field (according
+		to LayerMeta.FieldTypes) and the geometries as one contiguous
+		array of coordinates, where the coordinates of feature i are
+		Coordinates[GeometryOffsets[i]:GeometryOffsets[i+1]]. The structure
+		of the geometries is held by offset arrays: the parts of feature i
+		are PartOffsets[i]:PartOffsets[i+1], the rings of part j are
+		RingOffsets[j]:RingOffsets[j+1] and the coordinates of ring k are
+		CoordinateOffsets[k]:CoordinateOffsets[k+1].
+
+		Parameters
+		----------
+		features : iterable
+			wfs20.util.Feature objects, e.g. DataReader.IterFeatures().
+			The features are consumed one by one and not kept
+		layermeta : wfs20.util.LayerMeta
+			Metadata of the layer. Read after all features are consumed,
+			so it may be filled while streaming
+
+		Returns
+		-------
+		FeatureTable
+		"""
+
+		if not NUMPY_INSTALLED:
+			raise ModuleNotFoundError("Cannot create a FeatureTable as numpy is not installed.")
+
+		raw = {}
+		ids = []
+		types = []
+		coords = array("d")
+		offsets = array("q",[0])
+		part_offsets = array("q",[0])
+		ring_offsets = array("q",[0])
+		coord_offsets = array("q",[0])
+		dim = None
+		n = 0
+		for f in features:
+			for header,v in f.Fields.items():
+				if header not in raw:
+					raw[header] = [None] * n
+				raw[header].append(v)
+			n += 1
+			for values in raw.values():
+				if len(values) < n:
+					values.append(None)
+			ids.append(f.Id)
+			geometry = getattr(f, "Geometry", None)
+			types.append(None if geometry is None else geometry.Type)
+			if geometry is not None and geometry.Type is not None:
+				if dim is None:
+					dim = geometry.Dimension
+				elif geometry.Dimension != dim:
+					raise WFSInternalError(
+						"Building table",
+						f"Geometries with {dim} and {geometry.Dimension} dimensions can not be combined"
+						)
+				for part in geometry.Parts:
+					for ring in part:
+						coords.extend(ring)
+						coord_offsets.append(len(coords) // dim)
+					ring_offsets.append(len(coord_offsets) - 1)
+			part_offsets.append(len(ring_offsets) - 1)
+			offsets.append(len(coords) // (dim or 2))
+
+		self.Length = n
+		self.Ids = np.array(ids, dtype=object)
+		self.FieldTypes = {}
+		self.Columns = {}
+		self.Valid = {}
+		for header,values in raw.items():
+			t = layermeta.FieldTypes.get(header, str)
+			self.FieldTypes[header] = t
+			self.Columns[header], self.Valid[header] = _Column(values, t)
+		raw = None
+		self.Dimension = dim or 2
+		self.Coordinates = np.frombuffer(coords, dtype=np.float64).reshape(-1, self.Dimension)
+		self.GeometryOffsets = np.frombuffer(offsets, dtype=np.int64)
+		self.GeometryTypes = np.array(types, dtype=object)
+		self.PartOffsets = np.frombuffer(part_offsets, dtype=np.int64)
+		self.RingOffsets = np.frombuffer(ring_offsets, dtype=np.int64)
+		self.CoordinateOffsets = np.frombuffer(coord_offsets, dtype=np.int64)
+
+	def __repr__(self):
+		return f"<wfs20.columnar.FeatureTable object ({self.Length} features)>"
+
+	def __len__(self):
+		return self.Length
+
+	def Geometry(
+		self,
+		i: int,
+	) -> 'numpy.ndarray':
+		"""Coordinates of a single feature (a view on FeatureTable.Coordinates)
+		"""
+
+		return self.Coordinates[self.GeometryOffsets[i]:self.GeometryOffsets[i+1]]
+
+	def ToArrow(self) -> 'pyarrow.Table':
+		"""Return the table as pyarrow.Table
+
+		Attribute arrays are passed to arrow without copying where the
+		type allows it. The geometry column is a list of parts, each a
+		list of rings, each a list of coordinate tuples, on top of
+		FeatureTable.Coordinates (like the multipolygon encoding of GeoArrow),
+		the geometry_type column holds the type of the geometry.
+
+		Returns
+		-------
+		pyarrow.Table
+		"""
+
+		if not ARROW_INSTALLED:
+			raise ModuleNotFoundError("Cannot execute function as pyarrow is not installed.")
+		columns = {"id": pa.array(self.Ids, type=pa.string())}
+		for header,column in self.Columns.items():
+			valid = self.Valid[header]
+			if self.FieldTypes[header] == str:
+				columns[header] = pa.array(column, type=pa.string())
+			elif valid.all():
+				columns[header] = pa.array(column)
+			else:
+				columns[header] = pa.array(column, mask=~valid)
+		points = pa.FixedSizeListArray.from_arrays(
+			pa.array(self.Coordinates.reshape(-1)), self.Dimension
+			)
+		rings = pa.ListArray.from_arrays(pa.array(self.CoordinateOffsets), points)
+		parts = pa.ListArray.from_arrays(pa.array(self.RingOffsets), rings)
+		columns["geometry"] = pa.ListArray.from_arrays(pa.array(self.PartOffsets), parts)
+		columns["geometry_type"] = pa.array(self.GeometryTypes, type=pa.string())
+		return pa.table(columns)
@@ -3,20 +3,40 @@ from wfs20._dbase import execute_read_query
 from wfs20.error import WFSError
 
 import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
 
-def _OrderFromDB(code):
+# Interned CRS objects by crs string
+_CRS_CACHE = {}
+_CRS_LOCK = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _YXCodes():
 	"""
-	Get the order out of the database by EPSG code
+	Load the EPSG codes with a yx axis order out of the database (once)
 	"""
 
 	conn = sqlite3.connect(Path(__path__[0],"data","axisorder.db"))
-	search_query = f"""\
-SELECT * FROM axisorder WHERE code = '{code}';
+	search_query = """\
+SELECT code FROM axisorder WHERE "order" = 'yx';
 """
 	r = execute_read_query(conn, search_query)
 	conn.close()
-	return r[0]
+	return frozenset(item[0] for item in r)
+
+def _OrderFromDB(code):
+	"""
+	Get the order by EPSG code, 'xy' for unknown codes
+	"""
+
+	try:
+		code = int(code)
+	except ValueError:
+		return "xy"
+	if code in _YXCodes():
+		return "yx"
+	return "xy"
 
 class CRS:
 	"""CRS object
@@ -29,9 +49,30 @@ class CRS:
 	Returns
 	-------
 	CRS object
+
+	Notes
+	-----
+	CRS objects are interned, creating a CRS from the same string
+	twice returns the same object.
 	"""
 
+	def __new__(cls,crs):
+		with _CRS_LOCK:
+			obj = _CRS_CACHE.get((cls,crs))
+			if obj is None:
+				obj = super().__new__(cls)
+				obj._Parse(crs)
+				_CRS_CACHE[(cls,crs)] = obj
+		return obj
+
 	def __init__(self,crs):
+		# All is set by _Parse when the object is created in __new__
+		pass
+
+	def __getnewargs__(self):
+		return (self.crs,)
+
+	def _Parse(self,crs):
 		self.crs = crs
 		self.na = "ogc"
 		if "urn:" in self.crs:
@@ -53,10 +94,7 @@ class CRS:
 			self.auth = s[-1].split(".")[0].upper()
 			self.code = s[-1].split("#")[-1]
 
-		try:
-			self.order = _OrderFromDB(self.code)[2]
-		except IndexError:
-			self.order = "xy"
+		self.order = _OrderFromDB(self.code)
 
 	def __repr__(self):
 		return f"<wfs20.crs.CRS object ({self.auth}:{self.code})>"
@@ -0,0 +1,337 @@
+from wfs20.geometry import _EncodeGeometry, Geometry
+from wfs20.util import _ElementKey, FES_NAMESPACE, GML_NAMESPACE
+
+import datetime
+from lxml import etree
+
+_NSMAP = {"fes":FES_NAMESPACE,"gml":GML_NAMESPACE}
+
+def _Literal(value):
+	"""Text of a literal value
+	"""
+
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	if isinstance(value, (datetime.date, datetime.datetime)):
+		return value.isoformat()
+	return str(value)
+
+def _Envelope(parent, bbox, crs):
+	"""Add a gml:Envelope of a bounding box (x1,y1,x2,y2) to a parent element
+
+	The corners are written in the axis order of the crs.
+	"""
+
+	env = etree.SubElement(parent, _ElementKey(GML_NAMESPACE, "Envelope"))
+	env.set("srsName",crs.GetURNCode())
+	if crs.order == "yx":
+		bbox = (bbox[1], bbox[0], bbox[3], bbox[2])
+	ll = etree.SubElement(env, _ElementKey(GML_NAMESPACE, "LowerCorner"))
+	ll.text = f"{bbox[0]} {bbox[1]}"
+	ur = etree.SubElement(env, _ElementKey(GML_NAMESPACE, "UpperCorner"))
+	ur.text = f"{bbox[2]} {bbox[3]}"
+	return env
+
+def _HasGeometry(f):
+	"""Whether an expression holds a geometry (e.g. a polygon to intersect)
+	"""
+
+	if isinstance(f, Intersects):
+		return True
+	if isinstance(f, _Logical):
+		return any(_HasGeometry(item) for item in f.Filters)
+	if isinstance(f, Not):
+		return _HasGeometry(f.Filter)
+	return False
+
+class Filter:
+	def __init__(self):
+		"""Base of the filter expressions (FES 2.0)
+
+		Expressions can be combined with & (And), | (Or) and ~ (Not).
+		"""
+
+		pass
+
+	def __repr__(self):
+		return f"<wfs20.filter.{self.__class__.__name__} object>"
+
+	def __and__(self, other):
+		return And(self, other)
+
+	def __or__(self, other):
+		return Or(self, other)
+
+	def __invert__(self):
+		return Not(self)
+
+	def _Build(self, parent):
+		"""Add the element(s) of the expression to a parent element
+		"""
+
+		raise NotImplementedError
+
+	def ToElement(self) -> etree._Element:
+		"""Return the expression as fes:Filter element
+
+		Returns
+		-------
+		lxml.etree._Element
+		"""
+
+		elem = etree.Element(_ElementKey(FES_NAMESPACE, "Filter"), nsmap=_NSMAP)
+		self._Build(elem)
+		return elem
+
+	def ToString(self) -> str:
+		"""Return the expression as fes:Filter in xml format
+
+		Returns
+		-------
+		str
+		"""
+
+		return etree.tostring(self.ToElement()).decode()
+
+class _Comparison(Filter):
+	def __init__(
+		self,
+		name: str,
+		value,
+		matchcase: bool=True,
+	):
+		self.Name = name
+		self.Value = value
+		self.MatchCase = matchcase
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, self.__class__.__name__))
+		if not self.MatchCase:
+			elem.set("matchCase","false")
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "Literal")).text = _Literal(self.Value)
+
+class PropertyIsEqualTo(_Comparison):
+	"""Value of the property equals the value
+	"""
+
+class PropertyIsNotEqualTo(_Comparison):
+	"""Value of the property differs from the value
+	"""
+
+class PropertyIsLessThan(_Comparison):
+	"""Value of the property is less than the value
+	"""
+
+class PropertyIsGreaterThan(_Comparison):
+	"""Value of the property is greater than the value
+	"""
+
+class PropertyIsLessThanOrEqualTo(_Comparison):
+	"""Value of the property is less than or equal to the value
+	"""
+
+class PropertyIsGreaterThanOrEqualTo(_Comparison):
+	"""Value of the property is greater than or equal to the value
+	"""
+
+class PropertyIsLike(Filter):
+	def __init__(
+		self,
+		name: str,
+		pattern: str,
+		wildcard: str="*",
+		singlechar: str=".",
+		escapechar: str="!",
+		matchcase: bool=True,
+	):
+		"""Value of the property matches a pattern
+
+		Parameters
+		----------
+		name : str
+			Name of the property
+		pattern : str
+			Pattern, e.g. 'Amster*'
+		wildcard : str, optional
+			Character matching any number of characters
+		singlechar : str, optional
+			Character matching a single character
+		escapechar : str, optional
+			Character escaping the wildcard and singlechar characters
+		matchcase : bool, optional
+			Whether the match is case sensitive
+		"""
+
+		self.Name = name
+		self.Pattern = pattern
+		self.WildCard = wildcard
+		self.SingleChar = singlechar
+		self.EscapeChar = escapechar
+		self.MatchCase = matchcase
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "PropertyIsLike"))
+		elem.set("wildCard",self.WildCard)
+		elem.set("singleChar",self.SingleChar)
+		elem.set("escapeChar",self.EscapeChar)
+		if not self.MatchCase:
+			elem.set("matchCase","false")
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "Literal")).text = self.Pattern
+
+class PropertyIsBetween(Filter):
+	def __init__(
+		self,
+		name: str,
+		lower,
+		upper,
+	):
+		"""Value of the property lies between two values (inclusive)
+
+		Parameters
+		----------
+		name : str
+			Name of the property
+		lower : object
+			Lower boundary
+		upper : object
+			Upper boundary
+		"""
+
+		self.Name = name
+		self.Lower = lower
+		self.Upper = upper
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "PropertyIsBetween"))
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+		for key, value in (("LowerBoundary",self.Lower),("UpperBoundary",self.Upper)):
+			boundary = etree.SubElement(elem, _ElementKey(FES_NAMESPACE, key))
+			etree.SubElement(boundary, _ElementKey(FES_NAMESPACE, "Literal")).text = _Literal(value)
+
+class PropertyIsNull(Filter):
+	def __init__(
+		self,
+		name: str,
+	):
+		"""The property has no value
+
+		Parameters
+		----------
+		name : str
+			Name of the property
+		"""
+
+		self.Name = name
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "PropertyIsNull"))
+		etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+
+class _Logical(Filter):
+	def __init__(self, *filters):
+		self.Filters = []
+		# Flatten nested expressions of the same kind, e.g. a & b & c
+		for f in filters:
+			if isinstance(f, self.__class__):
+				self.Filters += f.Filters
+			else:
+				self.Filters.append(f)
+		if len(self.Filters) < 2:
+			raise ValueError(f"{self.__class__.__name__} needs at least two filters")
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, self.__class__.__name__))
+		for f in self.Filters:
+			f._Build(elem)
+
+class And(_Logical):
+	"""All of the filters apply
+	"""
+
+class Or(_Logical):
+	"""Any of the filters applies
+	"""
+
+class Not(Filter):
+	def __init__(
+		self,
+		filter: Filter,
+	):
+		"""The filter does not apply
+		"""
+
+		self.Filter = filter
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "Not"))
+		self.Filter._Build(elem)
+
+class BBOX(Filter):
+	def __init__(
+		self,
+		bbox: tuple,
+		crs: 'wfs20.crs.CRS',
+		name: str=None,
+	):
+		"""The geometry lies (partly) within a bounding box
+
+		Parameters
+		----------
+		bbox : tuple
+			Bounding box, e.g. (x1,y1,x2,y2)
+		crs : wfs20.crs.CRS
+			Projection of the bounding box
+		name : str, optional
+			Name of the geometry property, by default the
+			geometry of the featuretype
+		"""
+
+		self.BBOX = tuple(bbox)
+		self.CRS = crs
+		self.Name = name
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "BBOX"))
+		if self.Name is not None:
+			etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+		_Envelope(elem, self.BBOX, self.CRS)
+
+class Intersects(Filter):
+	def __init__(
+		self,
+		geometry: 'Geometry | dict',
+		crs: 'wfs20.crs.CRS',
+		name: str=None,
+	):
+		"""The geometry intersects a given geometry (e.g. a polygon)
+
+		Parameters
+		----------
+		geometry : wfs20.geometry.Geometry or dict
+			Geometry, either a Geometry object (e.g. of a feature, in the
+			axis order of Geometry.Order) or a GeoJSON geometry object
+			(x/y order)
+		crs : wfs20.crs.CRS
+			Projection of the geometry
+		name : str, optional
+			Name of the geometry property, by default the
+			geometry of the featuretype
+		"""
+
+		if isinstance(geometry, dict):
+			geometry = Geometry.from_geojson(geometry)
+		if geometry.Type is None:
+			raise ValueError("Geometry type is not supported")
+		self.Geometry = geometry
+		self.CRS = crs
+		self.Name = name
+
+	def _Build(self, parent):
+		elem = etree.SubElement(parent, _ElementKey(FES_NAMESPACE, "Intersects"))
+		if self.Name is not None:
+			etree.SubElement(elem, _ElementKey(FES_NAMESPACE, "ValueReference")).text = self.Name
+		elem.append(
+			_EncodeGeometry(self.Geometry, self.CRS.GetURNCode(), self.CRS.order == "yx")
+			)
@@ -0,0 +1,495 @@
+from wfs20.crs import CRS
+
+import sys
+import struct
+from array import array
+from lxml import etree
+
+NUMPY_INSTALLED = False
+SHAPELY_INSTALLED = False
+
+try:
+	import numpy as np
+	NUMPY_INSTALLED = True
+except ModuleNotFoundError:
+	pass
+
+try:
+	from shapely import wkb
+	SHAPELY_INSTALLED = True
+except ModuleNotFoundError:
+	pass
+
+# Not taken from wfs20.util, which imports this module
+GML_NAMESPACE = 'http://www.opengis.net/gml/3.2'
+
+_WKBTypes = {
+	"Point":1,
+	"LineString":2,
+	"Polygon":3,
+	"MultiPoint":4,
+	"MultiLineString":5,
+	"MultiPolygon":6,
+}
+
+def _Key(sub):
+	return f"{{{GML_NAMESPACE}}}{sub}"
+
+def _Array(values):
+	"""Float array of coordinate values, numpy when available
+	"""
+
+	if NUMPY_INSTALLED:
+		return np.array(values, dtype=np.float64)
+	return array("d", map(float, values))
+
+def _Dimension(elem, default):
+	"""srsDimension of an element, inherited from the geometry otherwise
+	"""
+
+	dim = elem.get("srsDimension")
+	if dim is None:
+		return default
+	return int(dim)
+
+def _Ring(elem, dim):
+	"""Flat coordinates of a LineString, LinearRing or Point like element
+	"""
+
+	pos_list = elem.find(_Key("posList"))
+	if pos_list is not None:
+		return _Array(pos_list.text.split()), _Dimension(pos_list, dim)
+	coordinates = elem.find(_Key("coordinates"))
+	if coordinates is not None:
+		cs = coordinates.get("cs", ",")
+		ts = coordinates.get("ts", " ")
+		tuples = coordinates.text.strip().split(ts)
+		values = [v for t in tuples if t for v in t.split(cs)]
+		return _Array(values), len(tuples[0].split(cs))
+	values = []
+	for pos in elem.iter(_Key("pos")):
+		dim = _Dimension(pos, dim)
+		values += pos.text.split()
+	if not values:
+		raise ValueError(f"No coordinates in {elem.tag}")
+	return _Array(values), dim
+
+def _Polygon(elem, dim):
+	"""Rings of a Polygon or PolygonPatch element
+	"""
+
+	rings = []
+	for boundary in ("exterior","interior"):
+		for b in elem.findall(_Key(boundary)):
+			ring = b.find(_Key("LinearRing"))
+			if ring is None:
+				raise ValueError("Only LinearRing boundaries are supported")
+			rings.append(_Ring(ring, dim))
+	return rings
+
+def _Curve(elem, dim):
+	"""Coordinates of a Curve made of LineStringSegments
+	"""
+
+	values = []
+	for segment in elem.find(_Key("segments")):
+		if etree.QName(segment).localname != "LineStringSegment":
+			raise ValueError(f"Curve segment {segment.tag} is not supported")
+		coords, dim = _Ring(segment, dim)
+		values += list(coords)
+	return _Array(values), dim
+
+def _Members(elem, names):
+	"""Geometries of the members of a multi geometry
+	"""
+
+	for name in names:
+		for member in elem.findall(_Key(name)):
+			yield from member
+
+def _Decode(elem, dim):
+	"""Type and parts (a list of parts, each a list of rings) of a gml geometry
+	"""
+
+	name = etree.QName(elem).localname
+	dim = _Dimension(elem, dim)
+	if name == "Point":
+		return "Point", [[_Ring(elem, dim)]]
+	if name == "LineString":
+		return "LineString", [[_Ring(elem, dim)]]
+	if name == "Curve":
+		return "LineString", [[_Curve(elem, dim)]]
+	if name == "Polygon":
+		return "Polygon", [_Polygon(elem, dim)]
+	if name == "Surface":
+		patches = elem.find(_Key("patches"))
+		if patches is None or len(patches) != 1:
+			raise ValueError("Only surfaces with a single patch are supported")
+		return "Polygon", [_Polygon(patches[0], dim)]
+	if name == "MultiPoint":
+		members = _Members(elem, ("pointMember","pointMembers"))
+		return "MultiPoint", [_Decode(e, dim)[1][0] for e in members]
+	if name in ("MultiCurve","MultiLineString"):
+		members = _Members(elem, ("curveMember","curveMembers","lineStringMember"))
+		return "MultiLineString", [_Decode(e, dim)[1][0] for e in members]
+	if name in ("MultiSurface","MultiPolygon"):
+		members = _Members(elem, ("surfaceMember","surfaceMembers","polygonMember"))
+		return "MultiPolygon", [_Decode(e, dim)[1][0] for e in members]
+	raise ValueError(f"Geometry type {name} is not supported")
+
+def _AxisOrder(srs):
+	"""Axis order ('xy' or 'yx') of the coordinates of a gml srsName
+
+	Short names (e.g. 'EPSG:4326') and unknown names are taken as x/y.
+	"""
+
+	if srs is None:
+		return "xy"
+	try:
+		return CRS(srs).order
+	except (AttributeError, IndexError):
+		return "xy"
+
+def _DecodeGeometry(elem):
+	"""Decode a gml geometry element into a Geometry object
+
+	Unsupported geometries (e.g. curves with arcs) are kept as
+	serialized gml in Geometry.GML.
+	"""
+
+	srs = elem.get("srsName")
+	try:
+		t, parts = _Decode(elem, 2)
+	except (ValueError, TypeError, AttributeError):
+		return Geometry(None, [], srs, gml=etree.tostring(elem))
+	dims = {dim for part in parts for _, dim in part}
+	dim = dims.pop() if len(dims) == 1 else 2
+	parts = [[coords for coords, _ in part] for part in parts]
+	return Geometry(t, parts, srs, dim, order=_AxisOrder(srs))
+
+def _FromCoordinates(t, coordinates):
+	"""Parts of a GeoJSON geometry, each a list of flat coordinate arrays
+	"""
+
+	def flat(points):
+		return [v for point in points for v in point]
+
+	if t == "Point":
+		return [[flat([coordinates])]]
+	if t == "LineString":
+		return [[flat(coordinates)]]
+	if t == "Polygon":
+		return [[flat(ring) for ring in coordinates]]
+	if t == "MultiPoint":
+		return [[flat([point])] for point in coordinates]
+	if t == "MultiLineString":
+		return [[flat(line)] for line in coordinates]
+	if t == "MultiPolygon":
+		return [[flat(ring) for ring in polygon] for polygon in coordinates]
+	raise ValueError(f"Geometry type {t} is not supported")
+
+def _FirstPoint(t, coordinates):
+	"""First point of a GeoJSON geometry, None when it is empty
+	"""
+
+	depth = {"Point":0,"LineString":1,"MultiPoint":1,"Polygon":2,"MultiLineString":2,"MultiPolygon":3}[t]
+	for _ in range(depth):
+		if not coordinates:
+			return None
+		coordinates = coordinates[0]
+	return coordinates or None
+
+def _Coordinates(ring, dim, yx):
+	"""Text of a flat coordinate array, with the first two axes swapped if yx
+	"""
+
+	values = [float(v) for v in ring]
+	if yx:
+		for i in range(0, len(values), dim):
+			values[i], values[i+1] = values[i+1], values[i]
+	return " ".join(map(repr, values))
+
+def _EncodeSingle(parent, t, part, dim, yx):
+	"""Add a Point, LineString or Polygon element to a parent element
+	"""
+
+	elem = etree.SubElement(parent, _Key(t))
+	if t == "Point":
+		pos = etree.SubElement(elem, _Key("pos"))
+		pos.text = _Coordinates(part[0], dim, yx)
+		return elem
+	if t == "LineString":
+		pos_list = etree.SubElement(elem, _Key("posList"))
+		pos_list.text = _Coordinates(part[0], dim, yx)
+		return elem
+	for i, ring in enumerate(part):
+		boundary = etree.SubElement(elem, _Key("exterior" if i == 0 else "interior"))
+		pos_list = etree.SubElement(
+			etree.SubElement(boundary, _Key("LinearRing")), _Key("posList")
+			)
+		pos_list.text = _Coordinates(ring, dim, yx)
+	return elem
+
+# Multi geometry element and member element per GeoJSON multi geometry type
+_GMLMulti = {
+	"MultiPoint":("MultiPoint","pointMember"),
+	"MultiLineString":("MultiCurve","curveMember"),
+	"MultiPolygon":("MultiSurface","surfaceMember"),
+}
+
+def _EncodeGeometry(
+	geometry: 'Geometry',
+	srs: str,
+	yx: bool=False,
+) -> etree._Element:
+	"""Encode a geometry as gml 3.2 element
+
+	Parameters
+	----------
+	geometry : Geometry
+		Geometry to encode, its coordinates are swapped when
+		Geometry.Order differs from the order to write
+	srs : str
+		srsName of the gml geometry
+	yx : bool, optional
+		Write the coordinates in y/x order (e.g. for EPSG:4326 urn's)
+	"""
+
+	if geometry.Type is None:
+		raise ValueError("Geometry could not be decoded, see Geometry.GML")
+	yx = yx != (geometry.Order == "yx")
+	holder = etree.Element("holder", nsmap={"gml":GML_NAMESPACE})
+	dim = geometry.Dimension
+	if geometry.Type in _GMLMulti:
+		multi, member = _GMLMulti[geometry.Type]
+		elem = etree.SubElement(holder, _Key(multi))
+		t = geometry.Type[5:]
+		for part in geometry.Parts:
+			_EncodeSingle(etree.SubElement(elem, _Key(member)), t, part, dim, yx)
+	else:
+		elem = _EncodeSingle(holder, geometry.Type, geometry.Parts[0], dim, yx)
+	elem.set("srsName", srs)
+	if dim != 2:
+		elem.set("srsDimension", str(dim))
+	return elem
+
+def _LittleEndian(coords):
+	"""Coordinates as little endian float64 bytes
+	"""
+
+	if NUMPY_INSTALLED and isinstance(coords, np.ndarray):
+		return coords.astype("<f8", copy=False).tobytes()
+	coords = array("d", coords)
+	if sys.byteorder == "big":
+		coords.byteswap()
+	return coords.tobytes()
+
+def _SwapXY(coords, dim):
+	"""Copy of a flat coordinate array with the first two axes swapped
+	"""
+
+	if NUMPY_INSTALLED and isinstance(coords, np.ndarray):
+		swapped = coords.reshape(-1, dim).copy()
+		swapped[:, [0, 1]] = swapped[:, [1, 0]]
+		return swapped.reshape(-1)
+	swapped = array("d", coords)
+	swapped[0::dim], swapped[1::dim] = swapped[1::dim], swapped[0::dim]
+	return swapped
+
+def _MinMax(values):
+	"""Minimum and maximum of a coordinate array
+	"""
+
+	if NUMPY_INSTALLED and isinstance(values, np.ndarray):
+		return float(values.min()), float(values.max())
+	return min(values), max(values)
+
+class Geometry:
+	def __init__(
+		self,
+		type: str,
+		parts: list,
+		srs: str=None,
+		dimension: int=2,
+		gml: bytes=None,
+		order: str="xy",
+	):
+		"""Decoded geometry of a feature
+
+		Coordinates (Geometry.Parts) and Geometry.Bounds are kept in the
+		axis order of the response, which is held by Geometry.Order. The
+		exports (ToGeoJSON, ToWKB and ToShapely) are always in x/y (e.g.
+		lon/lat) order.
+
+		Parameters
+		----------
+		type : str
+			One of 'Point', 'LineString', 'Polygon', 'MultiPoint',
+			'MultiLineString', 'MultiPolygon', or None when the geometry
+			could not be decoded
+		parts : list
+			List of parts, each a list of rings, each a flat array of
+			coordinates. A Point or LineString has one part with one ring,
+			a Polygon one part with a ring per boundary
+		srs : str, optional
+			srsName of the geometry
+		dimension : int, optional
+			Number of values per coordinate
+		gml : bytes, optional
+			Serialized gml of a geometry that could not be decoded
+		order : str, optional
+			Axis order of the coordinates, 'xy' or 'yx' (e.g. lat/lon
+			for gml in urn:ogc:def:crs:EPSG::4326)
+		"""
+
+		self.Type = type
+		self.Parts = parts
+		self.SRS = srs
+		self.Dimension = dimension
+		self.GML = gml
+		self.Order = order
+		self.Bounds = self._Bounds()
+
+	def __repr__(self):
+		return f"<wfs20.geometry.Geometry object ({self.Type})>"
+
+	@classmethod
+	def from_geojson(
+		cls,
+		obj: dict,
+		srs: str=None,
+	) -> 'Geometry':
+		"""Create a geometry from a GeoJSON geometry object
+
+		Unsupported geometries (e.g. GeometryCollection) get Type None.
+		GeoJSON coordinates are in x/y (e.g. lon/lat) order.
+
+		Parameters
+		----------
+		obj : dict
+			GeoJSON geometry object
+		srs : str, optional
+			srsName of the geometry
+		"""
+
+		try:
+			parts = _FromCoordinates(obj["type"], obj["coordinates"])
+		except (KeyError, TypeError, ValueError):
+			return cls(None, [], srs)
+		point = _FirstPoint(obj["type"], obj["coordinates"])
+		dim = 2 if point is None else len(point)
+		parts = [[_Array(ring) for ring in part] for part in parts]
+		return cls(obj["type"], parts, srs, dim)
+
+	def _Bounds(self):
+		"""Envelope (min1, min2, max1, max2) in the axis order of the coordinates
+		"""
+
+		d = self.Dimension
+		bounds = None
+		for part in self.Parts:
+			for ring in part:
+				if not len(ring):
+					continue
+				x1, x2 = _MinMax(ring[0::d])
+				y1, y2 = _MinMax(ring[1::d])
+				if bounds is None:
+					bounds = (x1, y1, x2, y2)
+				else:
+					bounds = (
+						min(bounds[0], x1),
+						min(bounds[1], y1),
+						max(bounds[2], x2),
+						max(bounds[3], y2),
+					)
+		return bounds
+
+	def _Tuples(self, ring):
+		d = self.Dimension
+		values = [float(v) for v in ring]
+		if self.Order == "yx":
+			for i in range(0, len(values), d):
+				values[i], values[i+1] = values[i+1], values[i]
+		return [values[i:i+d] for i in range(0, len(values), d)]
+
+	def ToGeoJSON(self) -> dict:
+		"""Return the geometry as GeoJSON geometry object
+
+		The coordinates are in x/y (e.g. lon/lat) order as GeoJSON
+		requires, also when the response is in y/x order.
+
+		Returns
+		-------
+		dict
+		"""
+
+		if self.Type is None:
+			raise ValueError("Geometry could not be decoded, see Geometry.GML")
+		if self.Type == "Point":
+			coordinates = self._Tuples(self.Parts[0][0])[0]
+		elif self.Type == "LineString":
+			coordinates = self._Tuples(self.Parts[0][0])
+		elif self.Type == "Polygon":
+			coordinates = [self._Tuples(r) for r in self.Parts[0]]
+		elif self.Type == "MultiPoint":
+			coordinates = [self._Tuples(p[0])[0] for p in self.Parts]
+		elif self.Type == "MultiLineString":
+			coordinates = [self._Tuples(p[0]) for p in self.Parts]
+		else:
+			coordinates = [[self._Tuples(r) for r in p] for p in self.Parts]
+		return {"type":self.Type,"coordinates":coordinates}
+
+	def ToWKB(self) -> bytes:
+		"""Return the geometry as (ISO, little endian) well-known binary
+
+		The coordinates are in x/y (e.g. lon/lat) order, like those of
+		Geometry.ToGeoJSON, also when the response is in y/x order.
+
+		Returns
+		-------
+		bytes
+		"""
+
+		if self.Type is None:
+			raise ValueError("Geometry could not be decoded, see Geometry.GML")
+		z = 1000 if self.Dimension == 3 else 0
+		swap = self.Order == "yx"
+
+		def header(t):
+			return struct.pack("<BI", 1, _WKBTypes[t] + z)
+
+		def values(ring):
+			return _LittleEndian(_SwapXY(ring, self.Dimension) if swap else ring)
+
+		def points(ring):
+			return struct.pack("<I", len(ring) // self.Dimension) + values(ring)
+
+		def single(t, part):
+			if t == "Point":
+				return header(t) + values(part[0])
+			if t == "LineString":
+				return header(t) + points(part[0])
+			return header(t) + struct.pack("<I", len(part)) + b"".join(points(r) for r in part)
+
+		if not self.Type.startswith("Multi"):
+			return single(self.Type, self.Parts[0])
+		t = self.Type[5:]
+		return (
+			header(self.Type)
+			+ struct.pack("<I", len(self.Parts))
+			+ b"".join(single(t, p) for p in self.Parts)
+			)
+
+	def ToShapely(self) -> 'shapely.Geometry':
+		"""Return the geometry as shapely geometry (requires shapely)
+
+		The coordinates are in x/y order, see Geometry.ToWKB.
+
+		Returns
+		-------
+		shapely.Geometry
+		"""
+
+		if not SHAPELY_INSTALLED:
+			raise ModuleNotFoundError("Cannot execute function as shapely is not installed.")
+		return wkb.loads(self.ToWKB())
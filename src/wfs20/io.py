@@ -1,33 +1,458 @@
 from wfs20.error import WFSInternalError
+from wfs20.util import _ParseValue
 from pathlib import Path
 
+import os
+import json
+import datetime
 import warnings
 import importlib.util
 
 GDAL_INSTALLED = False
+ORJSON_INSTALLED = False
 
 _SUPPORTED_DRIVERS = {
 	"ESRI Shapefile": ".shp",
 	"GeoJSON": ".geojson",
 	"GML": ".gml",
 	"netCDF": ".nc",
+	"GPKG": ".gpkg",
+	"FlatGeobuf": ".fgb",
+	"GeoJSONSeq": ".geojsonl",
 }
+# Drivers written without ogr
+_NATIVE_DRIVERS = ("GeoJSON", "GeoJSONSeq")
+# Drivers of which existing files can not be opened for appending
+_NO_APPEND = ("FlatGeobuf", "GeoJSON")
+# Number of features written per transaction
+_BATCHSIZE = 10000
 
 try:
 	from osgeo import ogr, osr
 	_FieldTypes = {
+	bool:ogr.OFTInteger,
 	int:ogr.OFTInteger64,
 	float:ogr.OFTReal,
+	datetime.date:ogr.OFTDate,
+	datetime.datetime:ogr.OFTDateTime,
 	str:ogr.OFTString
 	}
 	GDAL_INSTALLED = True
 except ModuleNotFoundError:
 	warnings.warn("osgeo package not installed. Writing to shapefile is not available.",ImportWarning)
 
+try:
+	import orjson
+	ORJSON_INSTALLED = True
+except ModuleNotFoundError:
+	pass
+
+def _JSONDefault(obj):
+	if isinstance(obj, (datetime.date, datetime.datetime)):
+		return obj.isoformat()
+	raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+def _DumpJSON(obj) -> bytes:
+	"""Compact json of an object as bytes, via orjson when installed
+	"""
+
+	if ORJSON_INSTALLED:
+		return orjson.dumps(obj)
+	return json.dumps(obj, separators=(",",":"), default=_JSONDefault).encode()
+
+def _Writer(
+	driver: str,
+	out: str,
+	keyword: str,
+	layermeta: 'wfs20.util.LayerMeta',
+	**kwargs,
+):
+	"""Return the writer of a driver
+
+	GeoJSON and GeoJSONSeq are written natively (without ogr),
+	the other drivers via ogr.
+	"""
+
+	if driver in _NATIVE_DRIVERS:
+		# Values not matching the type of a field are kept as text anyway
+		kwargs.pop("typed", None)
+		return _GeoJSONWriter(driver, out, keyword, layermeta, **kwargs)
+	return _OGRWriter(driver, out, keyword, layermeta, **kwargs)
+
+class _GeoJSONWriter:
+	def __init__(
+		self,
+		driver: str,
+		out: str,
+		keyword: str,
+		layermeta: 'wfs20.util.LayerMeta',
+		epsg: int=28992,
+		batchsize: int=_BATCHSIZE,
+		append: bool=False,
+	):
+		"""Writer of features to GeoJSON without ogr
+
+		'GeoJSON' writes a FeatureCollection, 'GeoJSONSeq' one feature
+		per line (newline delimited GeoJSON). Field values are converted
+		according to LayerMeta.FieldTypes, dates are written as iso
+		strings. Features are serialized per batch of batchsize features.
+
+		Parameters
+		----------
+		driver : str
+			Either 'GeoJSON' or 'GeoJSONSeq'
+		out : str
+			output directory
+		keyword : str
+			Name of the layer and the file
+		layermeta : wfs20.util.LayerMeta
+			Metadata of the layer
+		epsg : int, optional
+			Projection code of the geometries
+		batchsize : int, optional
+			Number of features serialized at once
+		append : bool, optional
+			Append to an existing file (only for 'GeoJSONSeq')
+		"""
+
+		if not driver in _NATIVE_DRIVERS:
+			raise WFSInternalError("Driver not found", f"'{driver}' can not be written without ogr")
+		path = Path(out,f'{keyword}{_SUPPORTED_DRIVERS[driver]}')
+		self.Path = path
+		self.Sequence = driver == "GeoJSONSeq"
+		if append and driver in _NO_APPEND and path.exists():
+			raise WFSInternalError("Writing to file", f"Appending is not supported by '{driver}'")
+
+		self.LayerMeta = layermeta
+		self.BatchSize = batchsize
+		self._File = open(path, "ab" if append and self.Sequence else "wb")
+		self._First = True
+		if not self.Sequence:
+			header = {"type":"FeatureCollection","name":keyword}
+			if epsg != 4326:
+				header["crs"] = {
+					"type":"name",
+					"properties":{"name":f"urn:ogc:def:crs:EPSG::{epsg}"}
+				}
+			self._File.write(_DumpJSON(header)[:-1] + b',"features":[\n')
+		# End of the committed features, see Abort
+		self._Committed = self._File.tell()
+		self._CommittedFirst = self._First
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def _Feature(self, f):
+		"""GeoJSON feature object of a feature
+		"""
+
+		types = self.LayerMeta.FieldTypes
+		properties = {}
+		for header,v in f.Fields.items():
+			value = _ParseValue(v, types.get(header, str))
+			# Values not matching the type of the field are kept as text
+			properties[header] = v if value is None else value
+		geometry = getattr(f, "Geometry", None)
+		if geometry is not None:
+			geometry = None if geometry.Type is None else geometry.ToGeoJSON()
+		return {
+			"type":"Feature",
+			"id":f.Id,
+			"properties":properties,
+			"geometry":geometry,
+		}
+
+	def _Flush(self, batch):
+		if not batch:
+			return
+		if self.Sequence:
+			self._File.write(b"\n".join(batch) + b"\n")
+			return
+		if not self._First:
+			self._File.write(b",\n")
+		self._File.write(b",\n".join(batch))
+		self._First = False
+
+	def Write(
+		self,
+		features,
+	):
+		"""Write features to the file
+
+		Parameters
+		----------
+		features : iterable
+			wfs20.util.Feature objects
+		"""
+
+		batch = []
+		for f in features:
+			batch.append(_DumpJSON(self._Feature(f)))
+			if len(batch) >= self.BatchSize:
+				self._Flush(batch)
+				batch = []
+		self._Flush(batch)
+
+	def Commit(self):
+		"""Make sure the written features are stored on disk
+		"""
+
+		self._File.flush()
+		os.fsync(self._File.fileno())
+		self._Committed = self._File.tell()
+		self._CommittedFirst = self._First
+
+	def Abort(self):
+		"""Discard the features written since the last commit and close the file
+		"""
+
+		if self._File is None:
+			return
+		self._File.flush()
+		self._File.truncate(self._Committed)
+		self._File.seek(self._Committed)
+		self._First = self._CommittedFirst
+		self.Close()
+
+	def Close(self):
+		"""Finish and close the file
+		"""
+
+		if self._File is None:
+			return
+		if not self.Sequence:
+			self._File.write(b"\n]}\n")
+		self._File.close()
+		self._File = None
+
+class _OGRWriter:
+	def __init__(
+		self,
+		driver: str,
+		out: str,
+		keyword: str,
+		layermeta: 'wfs20.util.LayerMeta',
+		epsg: int=28992,
+		batchsize: int=_BATCHSIZE,
+		append: bool=False,
+		typed: bool=True,
+	):
+		"""Writer of features to a file via ogr
+
+		Features are inserted in transactions of batchsize features (when
+		supported by the driver), using one FeatureDefn for the layer.
+
+		Parameters
+		----------
+		driver : str
+			ogr driver (e.g. 'GPKG')
+		out : str
+			output directory
+		keyword : str
+			Name of the layer and the file
+		layermeta : wfs20.util.LayerMeta
+			Metadata of the layer, fields are created from its FieldTypes
+			and LinkTable. Fields that appear later (e.g. while streaming)
+			are added when the first feature holding them is written
+		epsg : int, optional
+			Projection code of the geometries
+		batchsize : int, optional
+			Number of features per transaction
+		append : bool, optional
+			Append to the layer of an existing file instead of replacing it
+		typed : bool, optional
+			Create the fields with the types of layermeta. When the types
+			are inferred from part of the features only (e.g. while
+			streaming), pass False to create the fields as text, as the
+			type of a field can not be changed once features are written.
+			A value not matching the type of its field raises an error
+
+		Raises
+		------
+		WFSInternalError
+			When writing a value that does not match the type of its field
+		"""
+
+		if not importlib.util.find_spec("osgeo"):
+			raise ModuleNotFoundError("Cannot execute function as osgeo is not installed.")
+		if not driver in _SUPPORTED_DRIVERS:
+			raise WFSInternalError("Driver not found", f"'{driver}' not in list of available drivers for wfs20")
+		Driver = ogr.GetDriverByName(driver)
+		path = Path(out,f'{keyword}{_SUPPORTED_DRIVERS[driver]}')
+
+		self.Path = path
+		self.LayerMeta = layermeta
+		self.BatchSize = batchsize
+		self.Typed = typed
+		self._Source = None
+		self._Layer = None
+		if path.exists():
+			if append and driver in _NO_APPEND:
+				raise WFSInternalError("Writing to file", f"Appending is not supported by '{driver}'")
+			if append:
+				self._Source = ogr.Open(str(path), 1)
+				self._Layer = self._Source.GetLayerByName(keyword)
+			else:
+				Driver.DeleteDataSource(str(path))
+		if self._Source is None:
+			self._Source = Driver.CreateDataSource(str(path))
+		if self._Layer is None:
+			srs = osr.SpatialReference()
+			srs.ImportFromEPSG(epsg)
+			self._Layer = self._Source.CreateLayer(keyword,srs)
+
+		self._Transactions = bool(self._Layer.TestCapability(ogr.OLCTransactions))
+		self._Pending = 0
+		self._Index = {}
+		for header in layermeta.FieldTypes:
+			self._Field(header)
+		self._Defn = self._Layer.GetLayerDefn()
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def _Field(self, header):
+		"""Return the index of the field of a header, creating it when missing
+		"""
+
+		t = self.LayerMeta.FieldTypes.get(header, str) if self.Typed else str
+		name = self.LayerMeta.LinkTable.get(header, header[0:10])
+		defn = self._Layer.GetLayerDefn()
+		if defn.GetFieldIndex(name) == -1:
+			field = ogr.FieldDefn(
+				name,
+				_FieldTypes[t]
+				)
+			if t == str:
+				field.SetWidth(100)
+			elif t == bool:
+				field.SetSubType(ogr.OFSTBoolean)
+			self._Layer.CreateField(field)
+			defn = self._Layer.GetLayerDefn()
+			self._Defn = defn
+		# The type of the field in the file, which may exist already (appending)
+		i = defn.GetFieldIndex(name)
+		self._Index[header] = (i, _FieldType(defn.GetFieldDefn(i)))
+		return self._Index[header]
+
+	def Write(
+		self,
+		features,
+	):
+		"""Write features to the layer
+
+		Parameters
+		----------
+		features : iterable
+			wfs20.util.Feature objects
+		"""
+
+		for f in features:
+			if self._Transactions and self._Pending == 0:
+				self._Layer.StartTransaction()
+			Feature = ogr.Feature(self._Defn)
+			for header,v in f.Fields.items():
+				if header in self._Index:
+					i, t = self._Index[header]
+				else:
+					i, t = self._Field(header)
+					Feature = _Redefine(Feature, self._Defn)
+				if t is not str:
+					value = _ParseValue(v,t)
+					if value is None:
+						raise WFSInternalError(
+							"Writing to file",
+							f"Value '{v}' of field '{header}' does not match its type ({t.__name__}) in {self.Path}"
+							)
+					if t is bool:
+						v = int(value)
+					elif t in (datetime.date, datetime.datetime):
+						v = value.isoformat()
+					else:
+						v = value
+				Feature.SetField(i, v)
+			if getattr(f, "Geometry", None) is not None:
+				if f.Geometry.Type is not None:
+					Geometry = ogr.CreateGeometryFromWkb(f.Geometry.ToWKB())
+					Feature.SetGeometryDirectly(Geometry)
+				elif f.Geometry.GML is not None:
+					Geometry = ogr.CreateGeometryFromGML(f.Geometry.GML.decode())
+					Feature.SetGeometryDirectly(Geometry)
+			self._Layer.CreateFeature(Feature)
+			self._Pending += 1
+			if self._Pending >= self.BatchSize:
+				self.Commit()
+		Feature = None
+
+	def Commit(self):
+		"""Commit the pending features of the current batch
+		"""
+
+		if self._Transactions and self._Pending > 0:
+			self._Layer.CommitTransaction()
+		elif self._Pending > 0:
+			self._Source.FlushCache()
+		self._Pending = 0
+
+	def Abort(self):
+		"""Discard the pending features and close the file
+
+		The pending features are only discarded when the driver
+		supports transactions (e.g. 'GPKG').
+		"""
+
+		if self._Source is None:
+			return
+		if self._Transactions and self._Pending > 0:
+			self._Layer.RollbackTransaction()
+			self._Pending = 0
+		self.Close()
+
+	def Close(self):
+		"""Commit the pending features and close the file
+		"""
+
+		if self._Source is None:
+			return
+		self.Commit()
+		self._Source.FlushCache()
+		# Clearing memory
+		self._Defn = None
+		self._Layer = None
+		self._Source = None
+
+def _FieldType(fielddefn):
+	"""Python type of the values of an ogr field
+	"""
+
+	t = fielddefn.GetType()
+	if t == ogr.OFTInteger and fielddefn.GetSubType() == ogr.OFSTBoolean:
+		return bool
+	if t in (ogr.OFTInteger, ogr.OFTInteger64):
+		return int
+	if t == ogr.OFTReal:
+		return float
+	if t == ogr.OFTDate:
+		return datetime.date
+	if t == ogr.OFTDateTime:
+		return datetime.datetime
+	return str
+
+def _Redefine(feature, defn):
+	"""Copy a feature to a FeatureDefn that gained a field
+	"""
+
+	new = ogr.Feature(defn)
+	new.SetFrom(feature)
+	return new
+
 def _WriteGeometries(
 	reader,
 	driver: str,
 	out: str,
+	batchsize: int=_BATCHSIZE,
+	append: bool=False,
+	epsg: int=None,
 ):
 	"""Write the geometries to harddrive
 
@@ -39,55 +464,35 @@ def _WriteGeometries(
 		ogr driver (e.g. 'GeoJSON')
 	out : str
 		output directory
+	batchsize : int, optional
+		Number of features written per transaction
+	append : bool, optional
+		Append to the layer of an existing file
+	epsg : int, optional
+		Projection code of the geometries, by default the projection
+		of the request of the reader (EPSG:28992 when unknown)
 
 	Raises
 	------
 	ModuleNotFoundError
-		_description_
+		When osgeo is not installed
 	"""
 
-	if not importlib.util.find_spec("osgeo"):
-		raise ModuleNotFoundError("Cannot execute function as osgeo is not installed.")
-	if not driver in _SUPPORTED_DRIVERS:
-		raise WFSInternalError("Driver not found", f"'{driver}' not in list of available drivers for wfs20")
-	Driver = ogr.GetDriverByName(driver)
-	_ext = _SUPPORTED_DRIVERS[driver]
-
-	srs = osr.SpatialReference()
-	srs.ImportFromEPSG(28992)
-
-	dst = Driver.CreateDataSource(str(Path(out,f'{reader.Keyword}{_ext}')))
-	Layer = dst.CreateLayer(reader.Keyword,srs)
-
-	# Create Fields of Layer
-	FieldTypes = reader.LayerMeta.FieldTypes
-	LinkTable = reader.LayerMeta.LinkTable
-
-	for header,t in FieldTypes.items():
-		field = ogr.FieldDefn(
-			LinkTable[header],
-			_FieldTypes[t]
-			)
-		if t == str:
-			field.SetWidth(100)
-		Layer.CreateField(field)
-
-	# Create and add Features to Layer
-	for f in reader.Features:
-		Feature = ogr.Feature(Layer.GetLayerDefn())
-		Geometry = ogr.CreateGeometryFromGML(f.Geometry.decode())
-		for header,v in f.Fields.items():
-			Feature.SetField(
-				LinkTable[header],
-				v
-				)
-		Feature.SetGeometry(Geometry)
-		Layer.CreateFeature(Feature)
-
-	# Clearing memory
-	FieldTypes = None
-	LinkTable = None
+	if epsg is None:
+		epsg = getattr(reader, "EPSG", None) or 28992
+	writer = _Writer(
+		driver,
+		out,
+		reader.Keyword,
+		reader.LayerMeta,
+		epsg=epsg,
+		batchsize=batchsize,
+		append=append,
+		)
+	try:
+		writer.Write(reader.IterFeatures())
+	except BaseException:
+		writer.Abort()
+		raise
+	writer.Close()
 	reader = None
-	Feature = None
-	Layer = None
-	dst = None
@@ -1,16 +1,99 @@
-from wfs20.request import parse_qsl, GetResponse 
-from wfs20.util import _BuildResonseMeta
+from wfs20.columnar import FeatureTable
+from wfs20.error import WFSError, WFSInternalError
+from wfs20.request import _CountingReader, _TIMEOUT, _WireBytes, parse_qsl, GetResponse 
+from wfs20.spatial import _FeatureBounds, _PointDistance, STRTree
+from wfs20.util import _BuildJSONMeta, _BuildResonseMeta, _BuildStreamMeta, _IsJSON, _IsJSONFormat, _Properties
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
 
 def _ServiceReader(
 	url: str,
-	timeout: int,
+	timeout: 'float | tuple',
+	session: 'requests.Session'=None,
+	retry: 'wfs20.request.RetryPolicy'=None,
 ) -> 'requests.models.Response':
 	"""Method to return response data for WFS service url
 	"""
 
-	r = GetResponse(url,timeout=timeout)
+	r = GetResponse(url,timeout=timeout,session=session,retry=retry)
 	return r
 
+def _ReadConcurrent(
+	jobs: list,
+	workers: int,
+) -> list:
+	"""Create DataReader objects in a pool of threads
+
+	Parameters
+	----------
+	jobs : list
+		Keyword arguments of DataReader per request
+	workers : int
+		Number of threads
+
+	Returns
+	-------
+	list
+		DataReader objects in the order of the jobs
+	"""
+
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		return list(pool.map(lambda kw: DataReader(**kw), jobs))
+
+def _ReadCombined(
+	url: str,
+	data: str,
+	keywords: list,
+	session: 'requests.Session'=None,
+	cache: 'wfs20.cache.ResponseCache'=None,
+	timeout: 'float | tuple'=_TIMEOUT,
+	retry: 'wfs20.request.RetryPolicy'=None,
+	epsg: int=None,
+) -> list:
+	"""Read the response of a request for several featuretypes
+
+	Parameters
+	----------
+	url : str
+		request url for geospatial data
+	data : str
+		Params in xml format, e.g. by wfs20.request.CreateMultiPostRequest
+	keywords : list
+		Designations of the requested layers
+
+	Returns
+	-------
+	list
+		DataReader objects in the order of the keywords, the first holds
+		the transfer metrics and NumberMatched of the whole response
+	"""
+
+	first = DataReader(
+		url, keywords[0], method="POST", data=data, session=session, cache=cache,
+		timeout=timeout, retry=retry, epsg=epsg
+		)
+	readers = [first]
+	for keyword in keywords[1:]:
+		reader = copy.copy(first)
+		reader.Keyword = keyword
+		reader.WireBytes = 0
+		reader.DecodedBytes = 0
+		reader._Index = None
+		_BuildResonseMeta(reader, first.gml, keyword)
+		readers.append(reader)
+	return readers
+
+def _UncacheOnError(stream, cache, key):
+	"""Remove a cached response when it turns out to be an exception report
+	"""
+
+	try:
+		yield from stream
+	except WFSError:
+		cache.Remove(key)
+		raise
+
 class DataReader:
 	def __init__(
 		self,
@@ -18,6 +101,14 @@ class DataReader:
 		keyword: str,
 		method: str="GET",
 		data: str=None,
+		stream: bool=False,
+		session: 'requests.Session'=None,
+		cache: 'wfs20.cache.ResponseCache'=None,
+		outputformat: str=None,
+		properties: list=None,
+		timeout: 'float | tuple'=_TIMEOUT,
+		retry: 'wfs20.request.RetryPolicy'=None,
+		epsg: int=None,
 	):
 		"""Response reader of a geospatial data request
 
@@ -31,6 +122,31 @@ class DataReader:
 			Request method, either 'GET' or 'POST'
 		data : str
 			Params in xml format
+		stream : bool
+			Parse the response incrementally while it is downloaded.
+			The features are then only available (once) via
+			DataReader.IterFeatures and are not kept in memory
+		session : requests.Session
+			Session used for the request, to reuse its connections
+		cache : wfs20.cache.ResponseCache
+			Cache of responses. On a hit the response is parsed from the
+			cache without any request to the service
+		outputformat : str
+			Requested format of the response. GeoJSON responses are
+			parsed into the same features as gml responses, but always
+			as a whole (also when streaming)
+		properties : list
+			Names of the requested properties. Only these fields are
+			parsed, also when the service returns more
+		timeout : float or tuple
+			Allowed timeout of the request, either one value or
+			separate (connect, read) timeouts
+		retry : wfs20.request.RetryPolicy
+			Policy for retrying a failed request, by default a failed
+			request is not retried
+		epsg : int
+			Projection code of the request, used when writing the
+			features to file
 
 		Returns
 		-------
@@ -42,17 +158,208 @@ class DataReader:
 		self.Keyword = keyword
 		self.RequestMethod = method
 		self.RequestData = data
+		self.Stream = stream
+		self.OutputFormat = outputformat
+		self.Properties = properties
+		self.Timeout = timeout
+		self.Retry = retry
+		self.EPSG = epsg
+		# Size of the response body as transferred (compressed) and decoded,
+		# 0 when the response is taken from the cache
+		self.WireBytes = 0
+		self.DecodedBytes = 0
+		# Spatial index of the features, built on the first spatial query
+		self._Index = None
 
 		# substance
-		_BuildResonseMeta(self, GetResponse(self.URL, timeout=30, method=method, data=data), self.Keyword)
+		key = None if cache is None else cache.Key(url, method, data)
+		if stream and not _IsJSONFormat(outputformat):
+			self._BuildStream(session, cache, key)
+			return
+		content = None if cache is None else cache.Get(key)
+		if content is None:
+			r = GetResponse(
+				self.URL, timeout=self.Timeout, method=method, data=data,
+				session=session, retry=self.Retry
+				)
+			content = r.content
+			self.DecodedBytes = len(content)
+			self.WireBytes = _WireBytes(r, self.DecodedBytes)
+			if cache is not None:
+				cache.Put(key, content)
+		if _IsJSON(content):
+			_BuildJSONMeta(self, content, self.Keyword, _Properties(properties))
+		else:
+			_BuildResonseMeta(self, content, self.Keyword, _Properties(properties))
+		if stream:
+			self._Stream = iter(self.Features)
+			self.Features = []
 
 	def __repr__(self):
 		return super().__repr__()
 
+	def _BuildStream(self, session, cache, key):
+		"""Set up the streamed parsing of the response (or cached response)
+		"""
+
+		source = None if cache is None else cache.Open(key)
+		code = 200
+		if source is None:
+			r = GetResponse(
+				self.URL, timeout=self.Timeout, method=self.RequestMethod, data=self.RequestData,
+				stream=True, session=session, retry=self.Retry
+				)
+			source, code = _CountingReader(r, self), r.status_code
+			if cache is not None:
+				source = cache.Fetch(key, source)
+		_BuildStreamMeta(self, source, self.Keyword, code, _Properties(self.Properties))
+		if cache is not None:
+			self._Stream = _UncacheOnError(self._Stream, cache, key)
+
+	def IterFeatures(self):
+		"""Iterate over the features held by the reader
+
+		In streaming mode the features are yielded as soon as they
+		are parsed from the response. LayerMeta is updated on the fly
+		and is complete once the iteration is exhausted.
+
+		Yields
+		------
+		wfs20.util.Feature
+		"""
+
+		if not self.Stream:
+			yield from self.Features
+			return
+		yield from self._Stream
+
+	def ToTable(self) -> 'wfs20.columnar.FeatureTable':
+		"""Return the features as a columnar table (requires numpy)
+
+		In streaming mode the stream is consumed while building the table,
+		so the features are never held as individual objects.
+
+		Returns
+		-------
+		wfs20.columnar.FeatureTable
+		"""
+
+		return FeatureTable(self.IterFeatures(), self.LayerMeta)
+
+	def _SpatialIndex(self):
+		"""Return the spatial index of the features, built when needed
+		"""
+
+		if self.Stream:
+			raise WFSInternalError(
+				"Spatial query",
+				"The features of a streamed reader are not kept, request without stream"
+				)
+		if self._Index is None:
+			self._Index = STRTree(_FeatureBounds(f) for f in self.Features)
+		return self._Index
+
+	def QueryBBOX(
+		self,
+		bbox: tuple,
+	) -> list:
+		"""Features of which the envelope intersects a bounding box
+
+		The features are looked up in a spatial index (STR R-tree) of
+		their envelopes, which is built on the first spatial query.
+		Coordinates are in the axis order of the response (see
+		wfs20.geometry.Geometry). Features without geometry are never
+		returned.
+
+		Parameters
+		----------
+		bbox : tuple
+			Bounding box (x1,y1,x2,y2)
+
+		Returns
+		-------
+		list
+			wfs20.util.Feature objects in the order of DataReader.Features
+		"""
+
+		return [self.Features[i] for i in self._SpatialIndex().Query(bbox)]
+
+	def QueryPoint(
+		self,
+		x: float,
+		y: float,
+	) -> list:
+		"""Features of which the geometry contains (or touches) a point
+
+		See DataReader.QueryBBOX.
+
+		Returns
+		-------
+		list
+			wfs20.util.Feature objects in the order of DataReader.Features
+		"""
+
+		return [
+			self.Features[i] for i in self._SpatialIndex().Query((x, y, x, y))
+			if _PointDistance(self.Features[i].Geometry, x, y) == 0
+			]
+
+	def Nearest(
+		self,
+		x: float,
+		y: float,
+		k: int=1,
+	) -> list:
+		"""The k features of which the geometry is nearest to a point
+
+		The distance is the planar distance to the geometry, 0 when the
+		point lies within it. See DataReader.QueryBBOX.
+
+		Parameters
+		----------
+		x : float
+			First coordinate of the point
+		y : float
+			Second coordinate of the point
+		k : int
+			Number of features
+
+		Returns
+		-------
+		list
+			wfs20.util.Feature objects, nearest first
+		"""
+
+		nearest = self._SpatialIndex().Nearest(
+			x, y, k, lambda i, x, y: _PointDistance(self.Features[i].Geometry, x, y)
+			)
+		return [self.Features[i] for i, _ in nearest]
+
+	def _Chain(self, readers):
+		"""Append the streams of other (lazily created) readers to this reader
+		"""
+
+		def chain(stream):
+			yield from stream
+			total = self.NumberReturned
+			for reader in readers:
+				yield from reader.IterFeatures()
+				self.LayerMeta |= reader.LayerMeta
+				total += reader.NumberReturned
+				self.WireBytes += reader.WireBytes
+				self.DecodedBytes += reader.DecodedBytes
+			self.NumberReturned = total
+
+		self._Stream = chain(self._Stream)
+
 	def __iadd__(self, other):
 		if isinstance(self, other.__class__):
 			self.Features += other.Features
 			self.LayerMeta |= other.LayerMeta
+			self.NumberReturned += other.NumberReturned
+			self.WireBytes += other.WireBytes
+			self.DecodedBytes += other.DecodedBytes
+			self._Index = None
 			return self
 		else:
 			raise TypeError(f"unsupported operand type(s) for +=: '{self.__class__}' and '{other.__class__}'")
@@ -1,10 +1,31 @@
-from wfs20.error import WFSError
+from wfs20.error import WFSError, WFSInternalError
+from wfs20.filter import BBOX
 from wfs20.util import _PostElement, WFS_NAMESPACE
 
 import sys
+import time
+import random
 import requests
+import threading
+import weakref
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from lxml import etree
-from urllib.parse import parse_qsl, urlencode
+from urllib.parse import parse_qsl, urlencode, urlparse
+from urllib3.util.request import ACCEPT_ENCODING
+
+# Maximum number of simultaneous requests to a single host
+_HOST_LIMIT = 4
+_HOST_SEMAPHORES = {}
+_HOST_BUCKETS = {}
+_HOST_LOCK = threading.Lock()
+# Maximum time in seconds to wait for a free request to a host
+_HOST_WAIT = 300
+# Default (connect, read) timeout in seconds
+_TIMEOUT = (10, 30)
+# Content encodings that can be decoded while reading the response:
+# gzip and deflate, plus br and zstd when brotli and zstandard are installed
+_ACCEPT_ENCODING = ", ".join(e.strip() for e in ACCEPT_ENCODING.split(","))
 
 def _BaseRequestURL(url):
 	"""Separate the url in a base-url and parameters
@@ -30,11 +51,230 @@ def _ServiceURL(url, version):
 	urlpar = urlencode(par)
 	return "?".join([url.split("?")[0],urlpar])
 
+def SetHostLimit(
+	host: str,
+	limit: int,
+):
+	"""Set the maximum number of simultaneous requests to a host
+
+	A streamed response occupies a request until its body is read (or
+	the reader is garbage collected). A request waiting longer than
+	_HOST_WAIT seconds for a free request raises a WFSInternalError.
+
+	Parameters
+	----------
+	host : str
+		Host (and port) of the service, e.g. 'service.pdok.nl'
+	limit : int
+		Maximum number of simultaneous requests
+	"""
+
+	with _HOST_LOCK:
+		_HOST_SEMAPHORES[host] = threading.BoundedSemaphore(limit)
+
+def _HostSemaphore(url):
+	"""Return the semaphore limiting the requests to the host of the url
+	"""
+
+	host = urlparse(url).netloc
+	with _HOST_LOCK:
+		if host not in _HOST_SEMAPHORES:
+			_HOST_SEMAPHORES[host] = threading.BoundedSemaphore(_HOST_LIMIT)
+		return _HOST_SEMAPHORES[host]
+
+class RetryPolicy:
+	def __init__(
+		self,
+		retries: int=3,
+		backoff: float=0.5,
+		maxdelay: float=60,
+		jitter: bool=True,
+		statuses: tuple=(429, 500, 502, 503, 504),
+	):
+		"""Policy for retrying failed requests
+
+		A request is retried when the connection fails or times out, or
+		when the service responds with one of the statuses. The delay
+		before a retry grows exponentially (backoff * 2**attempt), unless
+		the service sets the delay with a Retry-After header.
+
+		Parameters
+		----------
+		retries : int, optional
+			Maximum number of retries of a request
+		backoff : float, optional
+			Delay in seconds before the first retry
+		maxdelay : float, optional
+			Maximum delay in seconds before a retry
+		jitter : bool, optional
+			Randomize the delays (between 0 and the delay), so that
+			simultaneous requests do not retry all at once
+		statuses : tuple, optional
+			Http status codes of which the request is retried
+		"""
+
+		self.Retries = retries
+		self.Backoff = backoff
+		self.MaxDelay = maxdelay
+		self.Jitter = jitter
+		self.Statuses = tuple(statuses)
+
+	def __repr__(self):
+		return f"<wfs20.request.RetryPolicy object ({self.Retries} retries)>"
+
+	def Delay(
+		self,
+		attempt: int,
+		response: requests.models.Response=None,
+	) -> float:
+		"""Delay in seconds before the retry of an attempt (starting at 0)
+		"""
+
+		retry_after = None if response is None else _RetryAfter(response)
+		if retry_after is not None:
+			return min(retry_after, self.MaxDelay)
+		delay = min(self.Backoff * 2 ** attempt, self.MaxDelay)
+		if self.Jitter:
+			delay = random.uniform(0, delay)
+		return delay
+
+def _RetryAfter(r):
+	"""Delay in seconds of the Retry-After header, None if absent or invalid
+	"""
+
+	value = r.headers.get("Retry-After")
+	if value is None:
+		return None
+	try:
+		return max(float(value), 0)
+	except ValueError:
+		pass
+	try:
+		return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+	except (TypeError, ValueError):
+		return None
+
+class _TokenBucket:
+	def __init__(self, rate=None, burst=1):
+		"""Rate limit of the requests to a host
+
+		A request takes a token, tokens are added at a rate per second up
+		to burst tokens. Without a rate requests are only held back while
+		the host asked to wait (see _TokenBucket.Hold).
+		"""
+
+		self.Rate = rate
+		self.Burst = burst
+		self._Tokens = burst
+		self._Time = time.monotonic()
+		self._Until = 0
+		self._Lock = threading.Lock()
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def Take(self):
+		"""Wait until a request is allowed
+		"""
+
+		while True:
+			with self._Lock:
+				now = time.monotonic()
+				wait = self._Until - now
+				if wait <= 0 and self.Rate is None:
+					return
+				if wait <= 0:
+					self._Tokens = min(self.Burst, self._Tokens + (now - self._Time) * self.Rate)
+					self._Time = now
+					if self._Tokens >= 1:
+						self._Tokens -= 1
+						return
+					wait = (1 - self._Tokens) / self.Rate
+			time.sleep(wait)
+
+	def Hold(self, delay):
+		"""Hold back all requests to the host for delay seconds
+		"""
+
+		with self._Lock:
+			self._Until = max(self._Until, time.monotonic() + delay)
+
+def SetRateLimit(
+	host: str,
+	rate: float,
+	burst: int=1,
+):
+	"""Set the maximum rate of requests to a host
+
+	Parameters
+	----------
+	host : str
+		Host (and port) of the service, e.g. 'service.pdok.nl'
+	rate : float
+		Maximum number of requests per second, None for no limit
+	burst : int, optional
+		Number of requests that may be sent at once after a quiet period
+	"""
+
+	with _HOST_LOCK:
+		_HOST_BUCKETS[host] = _TokenBucket(rate, burst)
+
+def _ReleaseHost(r):
+	"""Release the host of a streamed response (once), see GetResponse
+	"""
+
+	release = getattr(r, "_ReleaseHost", None)
+	if release is not None:
+		release()
+
+def _HostBucket(url):
+	"""Return the rate limit of the host of the url
+	"""
+
+	host = urlparse(url).netloc
+	with _HOST_LOCK:
+		if host not in _HOST_BUCKETS:
+			_HOST_BUCKETS[host] = _TokenBucket()
+		return _HOST_BUCKETS[host]
+
+def CreateSession(
+	poolsize: int=10,
+	headers: dict=None,
+) -> requests.Session:
+	"""Create a session that keeps connections to a host open for reuse
+
+	Parameters
+	----------
+	poolsize : int, optional
+		Number of connections kept open per host
+	headers : dict, optional
+		Headers sent with every request of the session. By default all
+		compressions that can be decoded are accepted (see _ACCEPT_ENCODING)
+
+	Returns
+	-------
+	requests.Session
+		Session with pooled (keep-alive) connections
+	"""
+
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=poolsize, pool_maxsize=poolsize)
+	session.mount("http://", adapter)
+	session.mount("https://", adapter)
+	session.headers["Accept-Encoding"] = _ACCEPT_ENCODING
+	if headers is not None:
+		session.headers.update(headers)
+	return session
+
 def GetResponse(
 	url: str,
 	timeout: int,
 	method: str ="GET",
 	data: str=None,
+	stream: bool=False,
+	session: requests.Session=None,
+	headers: dict=None,
+	retry: RetryPolicy=None,
 ) -> requests.models.Response:
 	"""Get the response from a url to be requested
 
@@ -42,12 +282,26 @@ def GetResponse(
 	----------
 	url : str
 		url to be requested
-	timeout : int
-		Allowed timeout after which an Exception is raised
+	timeout : float or tuple
+		Allowed timeout after which an Exception is raised, either one
+		value or separate (connect, read) timeouts
 	method : str, optional
 		Request method, either 'GET' or 'POST'
 	data : str, optional
 		Parameters in xml format
+	stream : bool, optional
+		Do not download the response body at once, but leave it to
+		be read incrementally via the raw response. The request counts
+		to the limit of the host (see SetHostLimit) until the body is
+		closed via _CountingReader or the response is released
+	session : requests.Session, optional
+		Session used for the request, to reuse its connections
+	headers : dict, optional
+		Additional headers of the request
+	retry : RetryPolicy, optional
+		Policy for retrying failed requests, by default a failed
+		request is not retried. A Retry-After of the service holds
+		back all requests to its host (see SetRateLimit)
 
 	Returns
 	-------
@@ -57,17 +311,70 @@ def GetResponse(
 
 	params = {}
 	params["timeout"] = timeout
+	params["stream"] = stream
 
+	if session is None:
+		headers = {"Accept-Encoding":_ACCEPT_ENCODING, **(headers or {})}
 	if data is not None:
 		params["data"] = data
+		headers = {"Content-Type":"application/xml", **(headers or {})}
+	if headers is not None:
+		params["headers"] = headers
 
-	r = requests.request(method,url,**params)
+	request = requests.request if session is None else session.request
+	bucket = _HostBucket(url)
+	semaphore = _HostSemaphore(url)
+	attempt = 0
+	while True:
+		bucket.Take()
+		if not semaphore.acquire(timeout=_HOST_WAIT):
+			raise WFSInternalError(
+				"Request Error",
+				f"No request to {urlparse(url).netloc} became available within {_HOST_WAIT} seconds, "
+				"make sure streamed readers are consumed (see SetHostLimit)"
+				)
+		try:
+			r = request(method,url,**params)
+		except (requests.ConnectionError, requests.Timeout):
+			semaphore.release()
+			if retry is None or attempt >= retry.Retries:
+				raise
+			time.sleep(retry.Delay(attempt))
+			attempt += 1
+			continue
+		except BaseException:
+			semaphore.release()
+			raise
+		if retry is None or attempt >= retry.Retries or r.status_code not in retry.Statuses:
+			break
+		delay = retry.Delay(attempt, r)
+		if r.status_code == 429 or "Retry-After" in r.headers:
+			bucket.Hold(delay)
+		r.close()
+		semaphore.release()
+		time.sleep(delay)
+		attempt += 1
+
+	# The body of a streamed response is transferred while it is read, so
+	# the host is only released once the response is closed (see _ReleaseHost)
+	if stream and r.status_code < 400:
+		r._ReleaseHost = weakref.finalize(r, semaphore.release)
+	else:
+		try:
+			r.content
+		finally:
+			semaphore.release()
 
 	if r.status_code in range(400,451,1):
 		raise WFSError("Client Error", r.status_code, r.text)
 	elif r.status_code in range(500,511,1):
 		raise WFSError("Server Error", r.status_code, r.text)
 
+	# Exception reports of a streamed response are caught while parsing,
+	# a not modified response has no body
+	if stream or r.status_code == 304:
+		return r
+
 	if "Content-Type" in r.headers and \
 			r.headers['Content-Type'] in ['text/xml', 'application/xml', 'application/vnd.ogc.se_xml']:
 		wfse = etree.fromstring(r.content)
@@ -85,6 +392,45 @@ def GetResponse(
 
 	return r
 
+def _WireBytes(
+	r: requests.models.Response,
+	default: int=None,
+) -> int:
+	"""Number of (possibly compressed) bytes of the response body
+	received over the wire so far, default when unknown
+	"""
+
+	try:
+		return r.raw.tell()
+	except AttributeError:
+		return default
+
+class _CountingReader:
+	def __init__(self, r, reader):
+		"""File-like object over the decoded body of a streamed response
+
+		Keeps the WireBytes and DecodedBytes of the reader up to date
+		while the body is read.
+		"""
+
+		self._Response = r
+		self._Raw = r.raw
+		self._Raw.decode_content = True
+		self._Reader = reader
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def read(self, size=-1):
+		chunk = self._Raw.read(None if size is None or size < 0 else size)
+		self._Reader.DecodedBytes += len(chunk)
+		self._Reader.WireBytes = _WireBytes(self._Response, self._Reader.DecodedBytes)
+		return chunk
+
+	def close(self):
+		self._Raw.close()
+		_ReleaseHost(self._Response)
+
 def BBOXGet(
 	bbox: tuple,
 	crs: int,
@@ -112,6 +458,25 @@ def BBOXGet(
 			crs.GetURICode1()
 			)
 
+def _SplitBBOX(
+	bbox: tuple,
+) -> list:
+	"""Split a bounding box in four quadrants
+
+	The split does not depend on the axis order, BBOXGet takes care of
+	ordering the coordinates of each quadrant according to the crs.
+	"""
+
+	x1, y1, x2, y2 = bbox
+	xm = (x1 + x2) / 2
+	ym = (y1 + y2) / 2
+	return [
+		(x1, y1, xm, ym),
+		(xm, y1, x2, ym),
+		(x1, ym, xm, y2),
+		(xm, ym, x2, y2),
+	]
+
 def CreateGetRequest(
 	url: str,
 	version: str,
@@ -119,6 +484,10 @@ def CreateGetRequest(
 	bbox: tuple,
 	crs: 'wfs20.crs.CRS',
 	startindex: int=None,
+	count: int=None,
+	outputformat: str=None,
+	filter: 'wfs20.filter.Filter'=None,
+	properties: list=None,
 ) -> str:
 	"""Create a geospatial data get request-url
 
@@ -137,6 +506,16 @@ def CreateGetRequest(
 		Object containing projection information
 	startindex : int, optional
 		Starting index of the feature count
+	count : int, optional
+		Maximum number of features to be returned
+	outputformat : str, optional
+		Format of the response, one of the OutputFormats of the
+		featuretype. By default the service returns gml
+	filter : wfs20.filter.Filter, optional
+		Expression the features have to satisfy (besides lying within
+		the bounding box)
+	properties : list, optional
+		Names of the properties to be returned, by default all
 
 	Returns
 	-------
@@ -150,13 +529,22 @@ def CreateGetRequest(
 		"request":"GetFeature"
 		}
 	params["typenames"] = [featuretype] 
-	params["bbox"] = BBOXGet(bbox, crs)
+	# The bbox and filter parameters are mutually exclusive
+	if filter is None:
+		params["bbox"] = BBOXGet(bbox, crs)
+	else:
+		params["filter"] = (BBOX(bbox, crs) & filter).ToString()
 	if startindex is not None:
 		params["startindex"] = startindex
+	if count is not None:
+		params["count"] = count
+	if outputformat is not None:
+		params["outputformat"] = outputformat
+	if properties is not None:
+		params["propertyname"] = ",".join(properties)
 	p = urlencode(params,doseq=True)
 	return f"{base}?{p}"
 
-# ToDo: Fix post requests for this library
 def CreatePostRequest(
 	url: str,
 	version: str,
@@ -164,6 +552,10 @@ def CreatePostRequest(
 	bbox: tuple,
 	crs: 'wfs20.crs.CRS',
 	startindex: int=None,
+	count: int=None,
+	outputformat: str=None,
+	filter: 'wfs20.filter.Filter'=None,
+	properties: list=None,
 ) -> tuple:
 	"""Generate post request-url & data
 
@@ -182,6 +574,16 @@ def CreatePostRequest(
 		Object containing projection information
 	startindex : int, optional
 		Starting index of the feature count
+	count : int, optional
+		Maximum number of features to be returned
+	outputformat : str, optional
+		Format of the response, one of the OutputFormats of the
+		featuretype. By default the service returns gml
+	filter : wfs20.filter.Filter, optional
+		Expression the features have to satisfy (besides lying within
+		the bounding box)
+	properties : list, optional
+		Names of the properties to be returned, by default all
 
 	Returns
 	-------
@@ -193,8 +595,64 @@ def CreatePostRequest(
 	elem = _PostElement(WFS_NAMESPACE, "GetFeature")
 	# set the data
 	elem.FeatureType(featuretype)
-	elem.BBOXPost(bbox, crs)
+	if properties is not None:
+		elem.PropertyName(properties)
+	if filter is None:
+		elem.BBOXPost(bbox, crs)
+	else:
+		elem.Filter(BBOX(bbox, crs) & filter)
 	if startindex is not None:
 		elem.StartIndex(startindex)
+	if count is not None:
+		elem.Count(count)
+	if outputformat is not None:
+		elem.OutputFormat(outputformat)
+
+	return base, elem.ToString()
+
+def CreateMultiPostRequest(
+	url: str,
+	version: str,
+	featuretypes: list,
+	bbox: tuple,
+	crs: 'wfs20.crs.CRS',
+	count: int=None,
+) -> tuple:
+	"""Generate post request-url & data for several featuretypes at once
+
+	Every featuretype is a separate query of one GetFeature request,
+	the response holds the features of all featuretypes.
+
+	Parameters
+	----------
+	url : str
+		Service url
+	version : str
+		Service version
+	featuretypes : list
+		Layers to be requested, mostly in the format of 'xxx:xxx'
+	bbox : tuple
+		Bounding box wherein the spatial data lies that is requested,
+		e.g. (x1,y1,x2,y2)
+	crs : wfs20.crs.CRS
+		Object containing projection information
+	count : int, optional
+		Maximum number of features to be returned (in total)
+
+	Returns
+	-------
+	tuple
+		Containing base url and the data in XML format
+	"""
+
+	base, _ = _BaseRequestURL(url)
+	elem = _PostElement(WFS_NAMESPACE, "GetFeature")
+	for i, featuretype in enumerate(featuretypes):
+		if i > 0:
+			elem.AddQuery()
+		elem.FeatureType(featuretype)
+		elem.BBOXPost(bbox, crs)
+	if count is not None:
+		elem.Count(count)
 
 	return base, elem.ToString()
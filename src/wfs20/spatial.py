@@ -0,0 +1,216 @@
+import math
+from heapq import heappop, heappush
+from itertools import count
+
+# Maximum number of entries per node of the tree
+_NODESIZE = 16
+
+def _Pack(entries, size):
+	"""Group entries in nodes of at most size entries (sort-tile-recursive)
+
+	Entries and nodes are tuples of (x1, y1, x2, y2, item), where the item
+	of a node is the list of its entries.
+	"""
+
+	n = math.ceil(len(entries) / size)
+	per = math.ceil(math.sqrt(n)) * size
+	entries = sorted(entries, key=lambda e: e[0] + e[2])
+	nodes = []
+	for i in range(0, len(entries), per):
+		slab = sorted(entries[i:i+per], key=lambda e: e[1] + e[3])
+		for j in range(0, len(slab), size):
+			group = slab[j:j+size]
+			nodes.append((
+				min(e[0] for e in group),
+				min(e[1] for e in group),
+				max(e[2] for e in group),
+				max(e[3] for e in group),
+				group,
+				))
+	return nodes
+
+def _EnvelopeDistance(e, x, y):
+	"""Distance of a point to an envelope, 0 when the point lies within
+	"""
+
+	dx = max(e[0] - x, 0, x - e[2])
+	dy = max(e[1] - y, 0, y - e[3])
+	return math.hypot(dx, dy)
+
+def _SegmentDistance(x, y, x1, y1, x2, y2):
+	"""Distance of a point to a line segment
+	"""
+
+	dx, dy = x2 - x1, y2 - y1
+	if dx == 0 and dy == 0:
+		return math.hypot(x - x1, y - y1)
+	t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+	return math.hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+def _InRing(c, d, x, y):
+	"""Whether a point lies within a ring of flat coordinates (even-odd rule)
+	"""
+
+	inside = False
+	n = len(c) // d
+	for i in range(n):
+		x1, y1 = c[i*d], c[i*d+1]
+		x2, y2 = c[(i+1)%n*d], c[(i+1)%n*d+1]
+		if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+			inside = not inside
+	return inside
+
+def _PointDistance(
+	geometry: 'wfs20.geometry.Geometry',
+	x: float,
+	y: float,
+) -> float:
+	"""Distance of a point to a geometry, 0 when the point lies on or within
+
+	Only the first two axes are used. Geometries that could not be
+	decoded are infinitely far.
+	"""
+
+	if geometry.Type is None:
+		return math.inf
+	d = geometry.Dimension
+	best = math.inf
+	for part in geometry.Parts:
+		rings = [ring.tolist() for ring in part]
+		if geometry.Type in ("Polygon", "MultiPolygon") and rings:
+			if _InRing(rings[0], d, x, y) and not any(_InRing(c, d, x, y) for c in rings[1:]):
+				return 0
+		for c in rings:
+			if geometry.Type in ("Point", "MultiPoint") or len(c) == d:
+				for i in range(0, len(c), d):
+					best = min(best, math.hypot(c[i] - x, c[i+1] - y))
+				continue
+			for i in range(0, len(c) - d, d):
+				best = min(best, _SegmentDistance(x, y, c[i], c[i+1], c[i+d], c[i+d+1]))
+	return best
+
+def _FeatureBounds(feature):
+	"""Envelope of the geometry of a feature, None without (decoded) geometry
+	"""
+
+	geometry = getattr(feature, "Geometry", None)
+	return None if geometry is None else geometry.Bounds
+
+class STRTree:
+	def __init__(
+		self,
+		bounds,
+		nodesize: int=_NODESIZE,
+	):
+		"""Static R-tree of envelopes, bulk loaded with sort-tile-recursive
+
+		Items are referred to by their position in bounds.
+
+		Parameters
+		----------
+		bounds : iterable
+			Envelopes (x1, y1, x2, y2) of the items, or None for items
+			without geometry (these are never returned)
+		nodesize : int, optional
+			Maximum number of entries per node
+
+		Returns
+		-------
+		STRTree
+		"""
+
+		level = [
+			(b[0], b[1], b[2], b[3], i) for i, b in enumerate(bounds)
+			if b is not None
+			]
+		self.Length = len(level)
+		while len(level) > nodesize:
+			level = _Pack(level, nodesize)
+		self._Root = _Pack(level, nodesize)[0] if level else None
+
+	def __repr__(self):
+		return f"<wfs20.spatial.STRTree object ({self.Length} items)>"
+
+	def __len__(self):
+		return self.Length
+
+	def Query(
+		self,
+		bbox: tuple,
+	) -> list:
+		"""Positions of the items of which the envelope intersects a bounding box
+
+		Parameters
+		----------
+		bbox : tuple
+			Bounding box (x1, y1, x2, y2)
+
+		Returns
+		-------
+		list
+			Positions of the items in ascending order
+		"""
+
+		if self._Root is None:
+			return []
+		x1, y1, x2, y2 = bbox
+		out = []
+		stack = [self._Root]
+		while stack:
+			for e in stack.pop()[4]:
+				if e[0] <= x2 and e[2] >= x1 and e[1] <= y2 and e[3] >= y1:
+					if isinstance(e[4], list):
+						stack.append(e)
+					else:
+						out.append(e[4])
+		out.sort()
+		return out
+
+	def Nearest(
+		self,
+		x: float,
+		y: float,
+		k: int=1,
+		distance=None,
+	) -> list:
+		"""The k items nearest to a point (best-first search)
+
+		Parameters
+		----------
+		x : float
+			First coordinate of the point
+		y : float
+			Second coordinate of the point
+		k : int, optional
+			Number of items
+		distance : callable, optional
+			Exact distance of an item to the point as distance(position, x, y),
+			never less than the distance to its envelope. By default the
+			distance to the envelope is used
+
+		Returns
+		-------
+		list
+			Tuples of (position, distance), nearest first
+		"""
+
+		if self._Root is None:
+			return []
+		tiebreak = count()
+		heap = [(0, next(tiebreak), 0, self._Root)]
+		out = []
+		while heap and len(out) < k:
+			d, _, kind, e = heappop(heap)
+			if kind == 0:
+				for child in e[4]:
+					heappush(heap, (
+						_EnvelopeDistance(child, x, y),
+						next(tiebreak),
+						0 if isinstance(child[4], list) else 1,
+						child,
+						))
+			elif kind == 1 and distance is not None:
+				heappush(heap, (distance(e[4], x, y), next(tiebreak), 2, e))
+			elif d != math.inf:
+				out.append((e[4], d))
+		return out
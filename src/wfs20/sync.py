@@ -0,0 +1,160 @@
+from wfs20.error import WFSInternalError
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+def _FeatureHash(feature) -> str:
+	"""Hash of the content (fields and geometry) of a feature
+	"""
+
+	h = hashlib.blake2b(digest_size=16)
+	for header in sorted(feature.Fields):
+		h.update(f"{header}\x1f{feature.Fields[header]}\x1e".encode())
+	geometry = getattr(feature, "Geometry", None)
+	if geometry is not None:
+		h.update(f"\x1d{geometry.Type}\x1d".encode())
+		if geometry.Type is None:
+			h.update(geometry.GML or b"")
+		else:
+			for part in geometry.Parts:
+				for ring in part:
+					h.update(ring.tobytes())
+					h.update(b"\x1e")
+				h.update(b"\x1d")
+	return h.hexdigest()
+
+def _FeatureId(feature) -> str:
+	"""Identifier of a feature, raises an error when it has none
+	"""
+
+	if feature.Id is None:
+		raise WFSInternalError(
+			"Synchronizing",
+			"Features without identifier (gml:id or GeoJSON id) can not be synchronized"
+			)
+	return feature.Id
+
+class Delta:
+	def __init__(self):
+		"""Changes of a layer since the previous synchronization
+
+		Attributes
+		----------
+		Inserted : list
+			wfs20.util.Feature objects unknown to the index
+		Updated : list
+			wfs20.util.Feature objects of which the content changed
+		Deleted : list
+			gml:id's of the features that are no longer returned
+		NumberChecked : int
+			Number of features returned by the service (in the listing
+			when a modified property is used)
+		"""
+
+		self.Inserted = []
+		self.Updated = []
+		self.Deleted = []
+		self.NumberChecked = 0
+		# New state of the index per gml:id, (hash, modified)
+		self._State = {}
+
+	def __repr__(self):
+		return (
+			f"<wfs20.sync.Delta object ({len(self.Inserted)} inserted, "
+			f"{len(self.Updated)} updated, {len(self.Deleted)} deleted)>"
+			)
+
+	def __len__(self):
+		return len(self.Inserted) + len(self.Updated) + len(self.Deleted)
+
+class FeatureIndex:
+	def __init__(
+		self,
+		path: str,
+	):
+		"""Index on disk (sqlite) of the synchronized features
+
+		Per layer the index holds the content hash and the value of
+		the modified property of every feature by its gml:id.
+
+		Parameters
+		----------
+		path : str
+			Path of the sqlite database, created when it does not exist
+
+		Returns
+		-------
+		FeatureIndex
+		"""
+
+		self.Path = Path(path)
+		self.Path.parent.mkdir(parents=True, exist_ok=True)
+		self._Connection = sqlite3.connect(self.Path)
+		with self._Connection:
+			self._Connection.execute(
+				"""CREATE TABLE IF NOT EXISTS features (
+				layer TEXT NOT NULL,
+				id TEXT NOT NULL,
+				hash TEXT NOT NULL,
+				modified TEXT,
+				PRIMARY KEY (layer, id)
+				) WITHOUT ROWID"""
+				)
+
+	def __repr__(self):
+		return f"<wfs20.sync.FeatureIndex object ({self.Path})>"
+
+	def Get(
+		self,
+		layer: str,
+	) -> dict:
+		"""Return the indexed features of a layer
+
+		Returns
+		-------
+		dict
+			(hash, modified) per gml:id
+		"""
+
+		rows = self._Connection.execute(
+			"SELECT id, hash, modified FROM features WHERE layer = ?", (layer,)
+			)
+		return {fid:(h, modified) for fid, h, modified in rows}
+
+	def Apply(
+		self,
+		layer: str,
+		delta: Delta,
+	):
+		"""Update the index of a layer with a delta, in one transaction
+		"""
+
+		with self._Connection:
+			self._Connection.executemany(
+				"INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)",
+				((layer, fid, h, modified) for fid, (h, modified) in delta._State.items()),
+				)
+			self._Connection.executemany(
+				"DELETE FROM features WHERE layer = ? AND id = ?",
+				((layer, fid) for fid in delta.Deleted),
+				)
+
+	def Clear(
+		self,
+		layer: str=None,
+	):
+		"""Remove a layer (or all layers) from the index
+		"""
+
+		with self._Connection:
+			if layer is None:
+				self._Connection.execute("DELETE FROM features")
+			else:
+				self._Connection.execute("DELETE FROM features WHERE layer = ?", (layer,))
+
+	def Close(self):
+		"""Close the database
+		"""
+
+		self._Connection.close()
@@ -1,6 +1,12 @@
 from wfs20.crs import CRS
+from wfs20.error import WFSError
+from wfs20.geometry import _DecodeGeometry, Geometry
 
+import re
+import json
+import datetime
 from collections import defaultdict
+from collections.abc import Mapping
 from lxml import etree
 
 WFS_NAMESPACE = 'http://www.opengis.net/wfs/2.0'
@@ -11,11 +17,11 @@ FES_NAMESPACE = 'http://www.opengis.net/fes/2.0'
 XSI_NAMESPACE = 'http://www.w3.org/2001/XMLSchema-instance'
 XLI_NAMESPACE = 'http://www.w3.org/1999/xlink'
 
-def _BuildServiceMeta(wfs,r):
+def _BuildServiceMeta(wfs,content):
 	"""Method to build the metadata etc. of the service itself
 	"""
 
-	t = etree.fromstring(r.content)	
+	t = etree.fromstring(content)
 	# General Keywords
 	wfs.Keywords = [item.text for item in t.findall(_ElementKey(OWS_NAMESPACE, "ServiceIdentification/Keywords/Keyword"))]
 	# Some service meta like allowed wfs versions etc
@@ -25,10 +31,9 @@ def _BuildServiceMeta(wfs,r):
 		elif elem.attrib["name"] == "GetFeature":
 			wfs.GetFeatureMeta = GetFeatureMeta(elem)
 	# Featuretypes (Layers) and Featuretype Meta
-	wfs.FeatureTypeMeta = {}
-	for elem in t.findall(_ElementKey(WFS_NAMESPACE, "FeatureTypeList/FeatureType")):
-		tnm = FeatureTypeMeta(elem)
-		wfs.FeatureTypeMeta[tnm.FeatureType] = tnm
+	wfs.FeatureTypeMeta = _LazyFeatureTypeMeta(
+		t.findall(_ElementKey(WFS_NAMESPACE, "FeatureTypeList/FeatureType"))
+		)
 	wfs.FeatureTypes = tuple(
 		wfs.FeatureTypeMeta.keys()
 		)
@@ -67,25 +72,141 @@ def _BuildContentMeta(obj,elem):
 			)
 		)
 
-def _BuildResonseMeta(reader, r, keyword):
+def _BuildResonseMeta(reader, content, keyword, properties=None):
 	"""Method to build the metadata etc. of the geospatial data request
+
+	properties are the (local) names of the fields to keep, see _Properties
 	"""
 
-	t = etree.fromstring(r.content)
+	t = etree.fromstring(content)
 	# Generate Local NameSpace
-	_GetLocalNS(t.nsmap)
+	ns = _GetLocalNS(t.nsmap)
 	# Some identifiers
-	reader.gml = r.content
+	reader.gml = content
+	reader.NumberMatched = _NumberMatched(t)
 	# Get the requested feature xml's
 	reader.Features = []
-	for elem in t.iter(_ElementKey(LOC_NAMESPACE, keyword)):
-		reader.Features.append(Feature(elem))
+	for elem in t.iter(_ElementKey(ns, keyword)):
+		reader.Features.append(Feature(elem,ns,properties))
+	reader.NumberReturned = len(reader.Features)
 	# Get the Layer meta data
-	reader.LayerMeta = LayerMeta(t,keyword)	
+	reader.LayerMeta = LayerMeta(t,keyword,ns,properties)
 	t = None
 
+def _IsJSON(content):
+	"""Whether a response body is json (instead of xml)
+	"""
+
+	return content.lstrip()[:1] in (b"{", b"[")
+
+def _IsJSONFormat(outputformat):
+	"""Whether an outputFormat denotes (Geo)JSON
+	"""
+
+	return outputformat is not None and "json" in outputformat.lower()
+
+def _BuildJSONMeta(reader, content, keyword, properties=None):
+	"""Method to build the metadata etc. of a GeoJSON geospatial data request
+
+	The fields of the features are kept as text, like those of a gml
+	response, so that the field types are inferred in the same way.
+	"""
+
+	t = json.loads(content)
+	reader.gml = None
+	try:
+		reader.NumberMatched = int(t.get("numberMatched", t.get("totalFeatures")))
+	except (TypeError, ValueError):
+		reader.NumberMatched = None
+	srs = None
+	if isinstance(t.get("crs"), dict):
+		srs = t["crs"].get("properties", {}).get("name")
+	reader.Features = [
+		Feature.from_geojson(f, srs, properties) for f in t.get("features", [])
+		]
+	reader.NumberReturned = len(reader.Features)
+	reader.LayerMeta = LayerMeta(None,keyword)
+	for f in reader.Features:
+		reader.LayerMeta.Update(f)
+	t = None
+
+def _BuildStreamMeta(reader, source, keyword, code=200, properties=None):
+	"""Method to prepare the metadata of a streamed geospatial data request
+
+	source is a file-like object (e.g. the raw response) that is read
+	while iterating and closed afterwards, code the http status code
+	"""
+
+	# The raw response is never held in memory
+	reader.gml = None
+	reader.NumberMatched = None
+	reader.NumberReturned = None
+	reader.Features = []
+	reader.LayerMeta = LayerMeta(None,keyword)
+	reader._Stream = _IterResponseFeatures(reader, source, keyword, code, properties)
+
+def _IterResponseFeatures(reader, source, keyword, code, properties=None):
+	"""Incrementally parse the response body and yield the features
+	"""
+
+	context = etree.iterparse(source, events=("start","end"), huge_tree=True)
+	root = None
+	ns = None
+	tag = None
+	depth = 0
+	count = 0
+	try:
+		for event, elem in context:
+			if event == "start":
+				if root is None:
+					root = elem
+					if etree.QName(root).localname.endswith("ExceptionReport"):
+						for _ in context:
+							pass
+						raise WFSError("WFS Error", code, etree.tostring(root).decode())
+					ns = _GetLocalNS(root.nsmap)
+					tag = _ElementKey(ns, keyword)
+					reader.NumberMatched = _NumberMatched(root)
+				depth += 1
+				continue
+			depth -= 1
+			if elem.tag == tag:
+				feature = Feature(elem,ns,properties)
+				reader.LayerMeta.Update(feature)
+				elem.clear()
+				count += 1
+				yield feature
+			# Drop everything that is parsed and processed
+			if depth == 1:
+				elem.clear()
+				while elem.getprevious() is not None:
+					del root[0]
+		reader.NumberReturned = count
+	finally:
+		source.close()
+
+def _NumberMatched(root):
+	"""Total number of features matching the request, if reported
+	"""
+
+	try:
+		return int(root.get("numberMatched"))
+	except (TypeError, ValueError):
+		return None
+
+def _Properties(properties):
+	"""Local names of the selected properties, None when all are selected
+	"""
+
+	if properties is None:
+		return None
+	return frozenset(p.split(":")[-1] for p in properties)
+
 def _GetLocalNS(nsmap):
 	"""Local Namespace of the GetCapabilities and GetFeature Response
+
+	The namespace is returned so that parsers running in parallel
+	do not depend on the module wide value.
 	"""
 
 	global LOC_NAMESPACE
@@ -95,6 +216,7 @@ def _GetLocalNS(nsmap):
 		LOC_NAMESPACE = list(nsmap.values())[b_list.index(True)]
 	except ValueError:
 		LOC_NAMESPACE = ""
+	return LOC_NAMESPACE
 
 def _ElementKey(ns,sub):
 	"""Return key in xml format
@@ -105,22 +227,98 @@ def _ElementKey(ns,sub):
 	subs = sub.split("/")
 	return "/".join(tuple(map(ns_string,[ns]*len(subs),subs)))
 
+# Literal patterns for the field type inference. Numbers with a leading
+# zero (e.g. '0363' or '007') are codes and are kept as text
+_INT_PATTERN = re.compile(r"[+-]?(0|[1-9]\d*)\Z")
+_FLOAT_PATTERN = re.compile(r"[+-]?((0|[1-9]\d*)(\.\d*)?|\.\d+)([eE][+-]?\d+)?\Z")
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}\Z")
+_DATETIME_PATTERN = re.compile(
+	r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?\Z"
+	)
+# Parts of a datetime matched by _DATETIME_PATTERN
+_DATETIME_PARTS = re.compile(r"(.*?)(\.\d+)?(Z|[+-]\d{2}:?\d{2})?\Z")
+_BOOL_VALUES = {"true":True,"false":False}
+# Types that can be combined in one field without falling back to str
+_TYPE_PROMOTION = {
+	(int,float):float,
+	(float,int):float,
+	(datetime.date,datetime.datetime):datetime.datetime,
+	(datetime.datetime,datetime.date):datetime.datetime,
+}
+
 def _IsType(elem):
-	val = elem.text
-	try:
-		s = eval(val)
-	except Exception:
-		s = val
-	return type(s)
+	return _IsValueType(elem.text)
+
+def _IsValueType(val):
+	"""Type of a text value: bool, int, float, datetime.date,
+	datetime.datetime or str
+	"""
+
+	val = val.strip()
+	if _INT_PATTERN.match(val):
+		return int
+	if _FLOAT_PATTERN.match(val):
+		return float
+	if val.lower() in _BOOL_VALUES:
+		return bool
+	if _DATE_PATTERN.match(val):
+		return datetime.date
+	if _DATETIME_PATTERN.match(val):
+		return datetime.datetime
+	return str
+
+def _MergeFieldType(a,b):
+	"""Type of a field holding values of type a and b
+	"""
+
+	if a is None or a is b:
+		return b
+	return _TYPE_PROMOTION.get((a,b),str)
 
 def _IsFieldType(lst):
-	if float in lst:
-		type = float
-	else:
-		type = int
-	if str in lst:
-		type = str
-	return type
+	type = None
+	for t in lst:
+		type = _MergeFieldType(type,t)
+	return type or str
+
+def _ISODateTime(val):
+	"""Datetime text in the form accepted by datetime.fromisoformat on all
+	supported python versions: fractions of 6 digits and +hh:mm offsets
+	"""
+
+	base, fraction, offset = _DATETIME_PARTS.match(val).groups()
+	if fraction:
+		base += (fraction + "00000")[:7]
+	if offset == "Z":
+		base += "+00:00"
+	elif offset:
+		base += f"{offset[:3]}:{offset[-2:]}"
+	return base
+
+def _ParseValue(val,t):
+	"""Convert a text value to the given field type, None if not possible
+	"""
+
+	val = val.strip()
+	try:
+		if t is str:
+			return val
+		if t is bool:
+			return _BOOL_VALUES[val.lower()]
+		# Values that are not classified as number (e.g. the code '0363' in a
+		# field typed from other values) are not converted, as that would
+		# change them
+		if t is int:
+			return int(val) if _INT_PATTERN.match(val) else None
+		if t is float:
+			return float(val) if _FLOAT_PATTERN.match(val) else None
+		if t is datetime.date:
+			return datetime.date.fromisoformat(val[:10])
+		if t is datetime.datetime:
+			return datetime.datetime.fromisoformat(_ISODateTime(val))
+	except (KeyError, ValueError):
+		return None
+	return val
 
 class _PostElement(etree.ElementBase):
 	def __init__(self,ns,sub):
@@ -132,13 +330,26 @@ class _PostElement(etree.ElementBase):
 		self.tag = _ElementKey(ns, sub)
 		self.set("service","WFS")
 		self.set("version","2.0.0")
-		self._query = etree.SubElement(self,_ElementKey(GML_NAMESPACE, "Query"))
+		self._query = etree.SubElement(self,_ElementKey(WFS_NAMESPACE, "Query"))
+
+	def AddQuery(self):
+		"""Start a next query, the following settings apply to it
+		"""
+
+		self._query = etree.SubElement(self,_ElementKey(WFS_NAMESPACE, "Query"))
 
 	def FeatureType(self,featuretype):
 		"""Set the featuretype
 		"""
 
-		self._query.set("typenames",featuretype)
+		self._query.set("typeNames",featuretype)
+
+	def PropertyName(self,properties):
+		"""Set the properties to be returned
+		"""
+
+		for p in properties:
+			etree.SubElement(self._query, _ElementKey(WFS_NAMESPACE, "PropertyName")).text = p
 
 	def BBOXPost(self,bbox,crs):
 		"""Set the bbox for the post request
@@ -150,17 +361,37 @@ class _PostElement(etree.ElementBase):
 		c_elem = etree.SubElement(bb_elem, _ElementKey(GML_NAMESPACE, "Envelope"))
 		# Filling it in
 		c_elem.set("srsName",crs.GetURNCode())
-		# Setting the bounding box coordinates
+		# Setting the bounding box coordinates in the axis order of the crs
+		if crs.order == "yx":
+			bbox = (bbox[1], bbox[0], bbox[3], bbox[2])
 		ll = etree.SubElement(c_elem, _ElementKey(GML_NAMESPACE, "LowerCorner"))
 		ll.text = f"{bbox[0]} {bbox[1]}"
 		ur = etree.SubElement(c_elem, _ElementKey(GML_NAMESPACE, "UpperCorner"))
 		ur.text = f"{bbox[2]} {bbox[3]}"
 
+	def Filter(self,filter):
+		"""Set the filter (wfs20.filter.Filter) of the post request
+		"""
+
+		self._query.append(filter.ToElement())
+
 	def StartIndex(self, si):
 		"""Set the starting index of the request
 		"""
 
-		self.set("startindex",str(si))
+		self.set("startIndex",str(si))
+
+	def OutputFormat(self, outputformat):
+		"""Set the output format of the response
+		"""
+
+		self.set("outputFormat",outputformat)
+
+	def Count(self, count):
+		"""Set the maximum number of features of the request
+		"""
+
+		self.set("count",str(count))
 
 	def ToString(self):
 		"""Return the data in xml format for the post request
@@ -182,6 +413,37 @@ class GetFeatureMeta:
 	def __repr__(self):
 		return super().__repr__()
 
+class _LazyFeatureTypeMeta(Mapping):
+	def __init__(self,elems):
+		"""Mapping of featuretype to FeatureTypeMeta, built on first access
+
+		Only the names of the featuretypes are read up front, the
+		metadata (and crs objects) of a featuretype are created when
+		it is looked up.
+		"""
+
+		self._Elements = {}
+		for elem in elems:
+			self._Elements[elem.find(_ElementKey(WFS_NAMESPACE, "Name")).text] = elem
+		self._Meta = {}
+
+	def __repr__(self):
+		return f"<wfs20.util._LazyFeatureTypeMeta object ({len(self)} featuretypes)>"
+
+	def __getitem__(self,key):
+		if key not in self._Meta:
+			self._Meta[key] = FeatureTypeMeta(self._Elements[key])
+		return self._Meta[key]
+
+	def __iter__(self):
+		return iter(self._Elements)
+
+	def __len__(self):
+		return len(self._Elements)
+
+	def __contains__(self,key):
+		return key in self._Elements
+
 class FeatureTypeMeta:
 	def __init__(self,elem):
 		"""Create metadata of a featuretype
@@ -229,7 +491,7 @@ class FeatureTypeMeta:
 			self.MetaDataURLs.append(url.attrib["{http://www.w3.org/1999/xlink}href"])
 
 class Feature:
-	def __init__(self,elem):
+	def __init__(self,elem,ns=None,properties=None):
 		"""Holds data of individual features returned by the request
 		for geospatial data
 
@@ -237,57 +499,127 @@ class Feature:
 		----------
 		elem: lxml.etree._Element
 			Data corresponding to the feature
+		ns: str, optional
+			Local namespace of the response
+		properties: frozenset, optional
+			Names of the fields to read (see _Properties), the other
+			elements are skipped. The geometry is only decoded when
+			its element is selected
 
 		Returns
 		-------
 		Feature Object
 		"""
 
+		if ns is None:
+			ns = LOC_NAMESPACE
+		prefix = f"{{{ns}}}"
+		self.Id = elem.get(_ElementKey(GML_NAMESPACE, "id"))
 		self.Fields = {}
-		for e in elem.findall(_ElementKey(LOC_NAMESPACE, "*")):
+		for e in elem.findall(_ElementKey(ns, "*")):
+			name = e.tag[len(prefix):]
+			if properties is not None and name not in properties:
+				continue
 			if e.text and e.text.strip():
-				self.Fields[e.tag.replace(f"{{{LOC_NAMESPACE}}}","")] = e.text
-			if e.tag.replace(f"{{{LOC_NAMESPACE}}}","").lower() \
-			in ("geom","geometry","geometrie","shape"):
-				self.Geometry = etree.tostring(e[0])
+				self.Fields[name] = e.text
+			if name.lower() in ("geom","geometry","geometrie","shape"):
+				self.Geometry = _DecodeGeometry(e[0])
 
 	def __repr__(self):
 		return super().__repr__()
 
+	@classmethod
+	def from_geojson(cls, obj, srs=None, properties=None):
+		"""Create a feature from a GeoJSON feature object
+
+		Parameters
+		----------
+		obj: dict
+			GeoJSON feature object
+		srs: str, optional
+			srsName of the geometry
+		properties: frozenset, optional
+			Names of the fields to keep (see _Properties)
+
+		Returns
+		-------
+		Feature Object
+		"""
+
+		feature = cls.__new__(cls)
+		feature.Id = obj.get("id")
+		if feature.Id is not None:
+			feature.Id = str(feature.Id)
+		feature.Fields = {}
+		for k,v in (obj.get("properties") or {}).items():
+			if properties is not None and k not in properties:
+				continue
+			v = _JSONText(v)
+			if v is not None and v.strip():
+				feature.Fields[k] = v
+		if obj.get("geometry") is not None:
+			feature.Geometry = Geometry.from_geojson(obj["geometry"], srs)
+		return feature
+
+def _JSONText(v):
+	"""Text of a json value, as it would appear in gml
+	"""
+
+	if v is None:
+		return None
+	if isinstance(v, bool):
+		return "true" if v else "false"
+	if isinstance(v, (dict, list)):
+		return json.dumps(v)
+	return str(v)
+
 class LayerMeta:
-	def __init__(self,t,keyword):
+	def __init__(self,t,keyword,ns=None,properties=None):
 		"""Metadata for a shapefile layer based on gml data
 
 		Parameters
 		----------
 		t: lxml.etree._Element
-			gml data parsed by lxml.etree
+			gml data parsed by lxml.etree, or None to start with empty
+			metadata that is filled per feature (see LayerMeta.Update)
 		keyword: str
 			string associated with feature dependent values
+		ns: str, optional
+			Local namespace of the response
+		properties: frozenset, optional
+			Names of the fields to include (see _Properties)
 		"""
 
-		# Headers
-		self.FieldHeaders = set(
-			(item.tag.replace(f"{{{LOC_NAMESPACE}}}","") 
-				for item in t.iter(_ElementKey(LOC_NAMESPACE, "*")) 
-				if item.text and not item.text.strip() == "")
-			)
-		try:
-			self.FieldHeaders.remove(keyword)
-		except KeyError:
-			pass
-		finally:
-			# self.FieldHeaders = list(self.FieldHeaders)
-			pass
-		# Field types 
+		if t is None:
+			self.FieldHeaders = set()
+			self.FieldTypes = {}
+			self.LinkTable = {}
+			return
+		if ns is None:
+			ns = LOC_NAMESPACE
+		# Headers and field types in a single pass over the features of the
+		# layer, a response may hold other layers as well (several queries)
 		self.FieldTypes = {}
-		for header in self.FieldHeaders:
-			type_list = tuple(
-				map(_IsType,t.iter(_ElementKey(LOC_NAMESPACE,header)))
-				)
-			self.FieldTypes[header] = _IsFieldType(type_list)
-		type_list = None
-		# Create Header link table (max len 10 for shapefile attribute table headers)
+		types = self.FieldTypes
+		for feature in t.iter(_ElementKey(ns, keyword)):
+			for item in feature.iter(_ElementKey(ns, "*")):
+				if not item.text or item.text.strip() == "":
+					continue
+				header = item.tag.replace(f"{{{ns}}}","")
+				if properties is not None and header not in properties:
+					continue
+				types[header] = _MergeFieldType(types.get(header),_IsType(item))
+		types.pop(keyword,None)
+		self.FieldHeaders = set(types)
+		self._BuildLinkTable()
+
+	def __repr__(self):
+		return super().__repr__()
+
+	def _BuildLinkTable(self):
+		"""Create Header link table (max len 10 for shapefile attribute table headers)
+		"""
+
 		self.LinkTable = {}
 		count = dict(zip(
 			[item[0:10] for item in self.FieldHeaders],
@@ -302,8 +634,25 @@ class LayerMeta:
 			self.LinkTable[item] = n
 			count[ab] += 1
 
-	def __repr__(self):
-		return super().__repr__()
+	def Update(self,feature):
+		"""Update the metadata with the fields of a single feature
+
+		Parameters
+		----------
+		feature: wfs20.util.Feature
+			Feature of which the fields are added to the metadata
+		"""
+
+		new = False
+		for header,v in feature.Fields.items():
+			if header not in self.FieldTypes:
+				self.FieldHeaders.add(header)
+				new = True
+			self.FieldTypes[header] = _MergeFieldType(
+				self.FieldTypes.get(header),_IsValueType(v)
+				)
+		if new:
+			self._BuildLinkTable()
 
 	def __eq__(self,other):
 		if isinstance(self, other.__class__):
@@ -327,7 +676,7 @@ class LayerMeta:
 			for k,v in dd.items():
 				self.FieldTypes.update({k:_IsFieldType(v)})
 			dd = None
-			self.LinkTable |= other.LinkTable
+			self._BuildLinkTable()
 			return self
 		else:
 			raise TypeError(f"unsupported operand type(s) for |=: '{self.__class__}' and '{other.__class__}'")
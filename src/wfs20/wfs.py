@@ -1,17 +1,111 @@
+from wfs20.cache import _WriteAtomic, CapabilitiesCache, ResponseCache
+from wfs20.columnar import _ToValue
 from wfs20.crs import CRS
 from wfs20.error import WFSInternalError
-from wfs20.io import _WriteGeometries
-from wfs20.reader import _ServiceReader, DataReader
-from wfs20.request import _ServiceURL, CreateGetRequest
-from wfs20.util import _BuildServiceMeta
+from wfs20.filter import _HasGeometry, PropertyIsGreaterThanOrEqualTo
+from wfs20.io import _BATCHSIZE, _NO_APPEND, _SUPPORTED_DRIVERS, _Writer, _WriteGeometries
+from wfs20.reader import _ReadCombined, _ReadConcurrent, _ServiceReader, DataReader
+from wfs20.request import _ServiceURL, _SplitBBOX, _TIMEOUT, CreateGetRequest, CreateMultiPostRequest, CreatePostRequest, CreateSession, RetryPolicy
+from wfs20.sync import _FeatureHash, _FeatureId, Delta, FeatureIndex
+from wfs20.util import _BuildServiceMeta, _IsJSONFormat, LayerMeta
 
+import os
 import sys
+import json
+import queue
+import threading
+import warnings
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Page size used when the service does not advertise a CountDefault
+_PAGESIZE = 1000
+# Maximum number of times a bounding box is subdivided when tiling
+_MAXDEPTH = 8
+# Length of a GET request url above which POST is used (when supported)
+_MAXURL = 2048
+
+def _IsTruncated(reader, limit):
+	"""Whether the response of a request holds less than the matching features
+	"""
+
+	if reader.NumberMatched is not None:
+		return reader.NumberReturned < reader.NumberMatched
+	return limit is not None and reader.NumberReturned >= limit
+
+def _ProduceBatches(readers, batches, batchsize, stop):
+	"""Put the features of (streamed) readers in a queue
+
+	Per reader lists of at most batchsize features are put in the queue,
+	followed by the reader itself to mark the end of the page. None
+	marks the end. Runs in its own thread. An exception is put in the
+	queue to be raised by the consumer. Stops early when the stop
+	event is set.
+	"""
+
+	def put(item):
+		while not stop.is_set():
+			try:
+				batches.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				continue
+		return False
+
+	try:
+		for reader in readers:
+			batch = []
+			for f in reader.IterFeatures():
+				batch.append(f)
+				if len(batch) >= batchsize:
+					if not put(batch):
+						return
+					batch = []
+			if batch and not put(batch):
+				return
+			if not put(reader):
+				return
+		put(None)
+	except BaseException as e:
+		put(e)
+
+def _LoadCheckpoint(path, request):
+	"""State of an interrupted download, None when there is none
+
+	The state is only valid for the same request.
+	"""
+
+	try:
+		state = json.loads(Path(path).read_text())
+	except FileNotFoundError:
+		return None
+	if state["request"] != request:
+		raise WFSInternalError(
+			"Resuming download",
+			f"Checkpoint {path} belongs to another request, remove it to start over"
+			)
+	return state
+
+def _SaveCheckpoint(path, request, startindex, size):
+	"""Record the pages written so far
+	"""
+
+	state = {"request":request,"startindex":startindex,"size":size}
+	_WriteAtomic(path, json.dumps(state).encode())
 
 class WebFeatureService:
 	def __init__(
 		self,
 		url: str,
-		version: str="2.0.0"
+		version: str="2.0.0",
+		session: 'requests.Session'=None,
+		poolsize: int=10,
+		headers: dict=None,
+		cache: 'bool | wfs20.cache.CapabilitiesCache'=False,
+		responsecache: 'bool | wfs20.cache.ResponseCache'=False,
+		timeout: 'float | tuple'=_TIMEOUT,
+		retry: 'wfs20.request.RetryPolicy'=None,
 	) -> 'WebFeatureService':
 		"""WebFeatureService
 
@@ -22,6 +116,32 @@ class WebFeatureService:
 			Service url
 		version : str
 			WebFeatureService version
+		session : requests.Session, optional
+			Session (or any object with a compatible request method) used
+			for all requests to the service. By default a session with
+			pooled keep-alive connections is created
+		poolsize : int, optional
+			Number of connections kept open to the host of the service,
+			only used when no session is given
+		headers : dict, optional
+			Default headers sent with every request, only used when no
+			session is given
+		cache : bool or wfs20.cache.CapabilitiesCache, optional
+			Keep the GetCapabilities document in a cache on disk. When True
+			the default location and expiry time are used
+		responsecache : bool or wfs20.cache.ResponseCache, optional
+			Keep the GetFeature responses in a cache, so repeated requests
+			are answered without the service. When True the default
+			location and size are used
+		timeout : float or tuple, optional
+			Allowed timeout of every request, either one value or
+			separate (connect, read) timeouts in seconds
+		retry : wfs20.request.RetryPolicy, optional
+			Policy for retrying failed requests (connection errors,
+			timeouts and e.g. 429 or 503 responses). By default
+			RetryPolicy() is used, pass RetryPolicy(retries=0) to
+			never retry. The rate of requests to a host can be limited
+			with wfs20.request.SetRateLimit
 		
 		Returns
 		-------
@@ -32,9 +152,27 @@ class WebFeatureService:
 		self.url = url
 		self.version = version
 		self.ServiceURL = _ServiceURL(self.url,version)
+		if session is None:
+			session = CreateSession(poolsize, headers)
+		self.Session = session
+		self.Timeout = timeout
+		self.Retry = RetryPolicy() if retry is None else retry
 
 		# Substance
-		_BuildServiceMeta(self, _ServiceReader(self.ServiceURL,timeout=30))
+		if cache is True:
+			cache = CapabilitiesCache()
+		if cache:
+			content = cache.Get(
+				self.ServiceURL, timeout=self.Timeout, session=self.Session, retry=self.Retry
+				)
+		else:
+			content = _ServiceReader(
+				self.ServiceURL,timeout=self.Timeout,session=self.Session,retry=self.Retry
+				).content
+		_BuildServiceMeta(self, content)
+		if responsecache is True:
+			responsecache = ResponseCache()
+		self.ResponseCache = responsecache or None
 
 		# Declarations
 		self.DataReader = None
@@ -47,6 +185,14 @@ class WebFeatureService:
 		featuretype: str,
 		bbox: tuple,
 		epsg: int,
+		stream: bool=False,
+		pagesize: int=None,
+		workers: int=1,
+		tiling: bool=None,
+		outputformat: str=None,
+		filter: 'wfs20.filter.Filter'=None,
+		properties: list=None,
+		method: str=None,
 		):
 		"""Request spatial data from the WebFeatureService
 
@@ -60,6 +206,43 @@ class WebFeatureService:
 		epsg : int
 			The projection code of the requested data and the bounding box 
 			according to EPSG, e.g. 4326 (WGS84)
+		stream : bool
+			Parse the response while it is downloaded instead of holding
+			the whole document in memory. The features are then consumed
+			via DataReader.IterFeatures
+		pagesize : int
+			Number of features per request when the service implements
+			result paging (see <class>.Constraints). All pages are fetched
+			and merged into one reader. Defaults to the CountDefault of the
+			service and is capped by it
+		workers : int
+			Number of pages or tiles that are requested simultaneously.
+			The number of simultaneous requests to one host is further
+			limited by wfs20.request.SetHostLimit. Not used when streaming
+		tiling : bool
+			Split the bounding box in quadrants (recursively) as long as
+			a request is truncated by the feature limit of the service.
+			Features on the edges of tiles are de-duplicated on their
+			gml:id. By default tiling is used when the service does not
+			implement result paging. Not available when streaming
+		outputformat : str
+			Format of the response, one of the output formats of the
+			featuretype (see <class>.FeatureTypeMeta[<id>].OutputFormats).
+			'auto' selects a json format when offered, as json is more
+			compact and faster to parse than gml. By default gml is
+			requested. Json responses are never parsed incrementally
+		filter : wfs20.filter.Filter
+			Expression (see wfs20.filter) the features have to satisfy
+			besides lying within the bounding box, evaluated by the
+			service so that only matching features are transferred
+		properties : list
+			Names of the properties (fields) to be requested, by default
+			all. Only these are transferred and parsed; include the
+			geometry property to receive the geometries
+		method : str
+			Request method, 'GET' or 'POST'. By default POST is used when
+			the service supports it and the GET url would be too long or
+			the filter holds a geometry
 
 		Returns
 		-------
@@ -67,6 +250,576 @@ class WebFeatureService:
 			Contains the requested data
 		"""
 
+		self.DataReader = self._Request(
+			featuretype,
+			bbox,
+			epsg,
+			stream=stream,
+			pagesize=pagesize,
+			workers=workers,
+			tiling=tiling,
+			outputformat=outputformat,
+			filter=filter,
+			properties=properties,
+			method=method,
+			)
+		return self.DataReader
+
+	def _Request(
+		self,
+		featuretype,
+		bbox,
+		epsg,
+		stream=False,
+		pagesize=None,
+		workers=1,
+		tiling=None,
+		outputformat=None,
+		filter=None,
+		properties=None,
+		method=None,
+		):
+		"""Request spatial data, see RequestData
+
+		The reader is returned without being kept as <class>.DataReader.
+		"""
+
+		crs, keyword = self._CheckRequest(featuretype, epsg)
+		query = dict(
+			outputformat=self._OutputFormat(featuretype, outputformat),
+			filter=filter,
+			properties=properties,
+			method=method,
+			)
+		pagesize = self._PageSize(pagesize)
+		if tiling is None:
+			tiling = pagesize is None and not stream
+		if tiling:
+			if stream:
+				raise WFSInternalError(
+					"Request Error",
+					"Tiling is not available for streamed requests"
+					)
+			return self._ReadTiled(featuretype, bbox, crs, keyword, query, workers)
+		if pagesize is None:
+			return DataReader(
+				stream=stream,**self._Job(featuretype, bbox, crs, keyword, query)
+				)
+		pages = self._IterPages(featuretype, bbox, crs, keyword, query, pagesize, stream)
+		reader = next(pages)
+		if stream:
+			reader._Chain(pages)
+		elif workers > 1:
+			self._ReadPagesConcurrent(
+				reader, featuretype, bbox, crs, keyword, query, pagesize, workers
+				)
+		else:
+			for page in pages:
+				reader += page
+		return reader
+
+	def Download(
+		self,
+		featuretype: str,
+		bbox: tuple,
+		epsg: int,
+		out: str,
+		driver: str="GPKG",
+		pagesize: int=None,
+		batchsize: int=_BATCHSIZE,
+		queuesize: int=4,
+		outputformat: str=None,
+		filter: 'wfs20.filter.Filter'=None,
+		properties: list=None,
+		method: str=None,
+		resume: bool=False,
+		):
+		"""Download spatial data from the WebFeatureService directly to file
+
+		The pages of the request are parsed while they are downloaded
+		and the features are written in batches, so the data is never
+		held in memory as a whole. Parsing and writing run in separate
+		threads, connected by a queue of at most queuesize batches: when
+		writing falls behind, the download waits.
+
+		Parameters
+		----------
+		featuretype : str
+			Layer to be requested, mostly in the format of 'xxx:xxx'
+		bbox : tuple
+			Bounding box wherein the spatial data lies that is requested,
+			e.g. (x1,y1,x2,y2)
+		epsg : int
+			The projection code of the requested data and the bounding box 
+			according to EPSG, e.g. 4326 (WGS84)
+		out : str
+			path of the directory where the file should be written to
+		driver : str
+			Driver for writing the geometries, e.g. 'GPKG' (via ogr)
+			or 'GeoJSONSeq' (written without ogr)
+		pagesize : int
+			Number of features per request when the service implements
+			result paging, see RequestData. Without paging the features
+			are requested at once and a WFSInternalError is raised (after
+			writing) when the response is truncated by the feature limit
+			of the service
+		batchsize : int
+			Number of features handed to the writer at once and written
+			per transaction. As the field types are not known before
+			all features are read, the fields of files written via ogr
+			(e.g. 'GPKG') are text. GeoJSON values are typed, values not
+			matching the type inferred so far are kept as text.
+			Use RequestData and ToFile for typed fields
+		queuesize : int
+			Maximum number of parsed batches waiting to be written
+		outputformat : str
+			Format of the response, see RequestData
+		filter : wfs20.filter.Filter
+			Expression the features have to satisfy, see RequestData
+		properties : list
+			Names of the properties to be requested, see RequestData
+		method : str
+			Request method, see RequestData
+		resume : bool
+			Keep track of the written pages in a checkpoint file next to
+			the output ('<keyword>.checkpoint.json'). When a download is
+			interrupted (e.g. by an error of the service) calling Download
+			again with resume continues after the last written page,
+			appending to the output. The checkpoint is removed once the
+			download is complete. The driver has to support appending
+			(e.g. 'GPKG' or 'GeoJSONSeq'). Pages are written in a single
+			transaction and the features of a page that fails partway
+			are discarded, so with 'GPKG' and 'GeoJSONSeq' no features
+			are duplicated. The returned reader only covers the pages
+			fetched by the last call
+
+		Returns
+		-------
+		wfs20.reader.DataReader
+			The (consumed) streaming reader, holding the number of
+			features and the metadata of the layer
+		"""
+
+		self.DataReader = self._Download(
+			featuretype,
+			bbox,
+			epsg,
+			out,
+			driver=driver,
+			pagesize=pagesize,
+			batchsize=batchsize,
+			queuesize=queuesize,
+			outputformat=outputformat,
+			filter=filter,
+			properties=properties,
+			method=method,
+			resume=resume,
+			)
+		return self.DataReader
+
+	def _Download(
+		self,
+		featuretype,
+		bbox,
+		epsg,
+		out,
+		driver="GPKG",
+		pagesize=None,
+		batchsize=_BATCHSIZE,
+		queuesize=4,
+		outputformat=None,
+		filter=None,
+		properties=None,
+		method=None,
+		resume=False,
+		):
+		"""Download spatial data to file, see Download
+
+		The reader is returned without being kept as <class>.DataReader.
+		"""
+
+		crs, keyword = self._CheckRequest(featuretype, epsg)
+		query = dict(
+			outputformat=self._OutputFormat(featuretype, outputformat),
+			filter=filter,
+			properties=properties,
+			method=method,
+			)
+		pagesize = self._PageSize(pagesize)
+		if resume and driver in _NO_APPEND:
+			raise WFSInternalError(
+				"Request Error",
+				f"Resuming is not available for '{driver}', as it does not support appending"
+				)
+		checkpoint = Path(out, f"{keyword}.checkpoint.json")
+		request = dict(
+			featuretype=featuretype,
+			bbox=list(bbox),
+			epsg=epsg,
+			pagesize=pagesize,
+			driver=driver,
+			outputformat=query["outputformat"],
+			filter=None if filter is None else filter.ToString(),
+			properties=properties,
+			)
+		state = _LoadCheckpoint(checkpoint, request) if resume else None
+		startindex = 0
+		size = None
+		if state is not None:
+			startindex = state["startindex"]
+			size = state["size"]
+			# Drop the features of the page that was not completed
+			if size is not None:
+				os.truncate(Path(out, f"{keyword}{_SUPPORTED_DRIVERS[driver]}"), size)
+		if pagesize is None:
+			pages = (
+				DataReader(stream=True,**self._Job(featuretype, bbox, crs, keyword, query))
+				for _ in range(1 if startindex == 0 else 0)
+				)
+		else:
+			pages = self._IterPages(
+				featuretype, bbox, crs, keyword, query, pagesize, True, startindex
+				)
+
+		batches = queue.Queue(maxsize=queuesize)
+		stop = threading.Event()
+		producer = threading.Thread(
+			target=_ProduceBatches,
+			args=(pages, batches, batchsize, stop),
+			daemon=True,
+			)
+		producer.start()
+		meta = LayerMeta(None, keyword)
+		reader = None
+		writer = None
+		try:
+			while True:
+				batch = batches.get()
+				if batch is None:
+					break
+				if isinstance(batch, BaseException):
+					raise batch
+				if isinstance(batch, DataReader):
+					# End of a page
+					if writer is not None:
+						writer.Commit()
+					if reader is None:
+						reader = batch
+					else:
+						reader += batch
+					if resume:
+						startindex += batch.NumberReturned
+						if writer is not None and driver == "GeoJSONSeq":
+							size = writer.Path.stat().st_size
+						_SaveCheckpoint(checkpoint, request, startindex, size)
+					continue
+				for f in batch:
+					meta.Update(f)
+				if writer is None:
+					writer = _Writer(
+						driver,
+						out,
+						keyword,
+						meta,
+						epsg=epsg,
+						# Pages are committed at once when resuming
+						batchsize=sys.maxsize if resume else batchsize,
+						append=state is not None,
+						# The field types are only known from the first batch
+						typed=False,
+						)
+				writer.Write(batch)
+		except BaseException:
+			# Discard the features of the incomplete page (or batch)
+			if writer is not None:
+				writer.Abort()
+				writer = None
+			raise
+		finally:
+			stop.set()
+			if writer is not None:
+				writer.Close()
+			producer.join()
+		if resume:
+			checkpoint.unlink(missing_ok=True)
+		# Without paging a single request can be cut off by the feature limit
+		if pagesize is None and reader is not None and _IsTruncated(reader, self._CountLimit()):
+			raise WFSInternalError(
+				"Downloading",
+				f"The response is truncated by the feature limit of the service "
+				f"({reader.NumberReturned} of {reader.NumberMatched} features written), "
+				"use a smaller bounding box"
+				)
+		return reader
+
+	def RequestMany(
+		self,
+		jobs: list,
+		workers: int=4,
+		out: str=None,
+		driver: str="GPKG",
+		combine: bool=False,
+		) -> dict:
+		"""Request several featuretypes from the WebFeatureService at once
+
+		The requests are run in a pool of threads sharing the session
+		(and its connections) of the service. <class>.DataReader is
+		not changed.
+
+		Parameters
+		----------
+		jobs : list
+			The requests, either tuples of (featuretype, bbox, epsg) or
+			dicts with the keyword arguments of RequestData (or of
+			Download when out is given). Every featuretype can be
+			requested once, streaming is not available
+		workers : int
+			Number of requests that are run simultaneously. The number
+			of simultaneous requests to one host is further limited by
+			wfs20.request.SetHostLimit
+		out : str
+			path of the directory where the files should be written to.
+			When given every featuretype is downloaded to its own file
+			(see Download) instead of being held in memory
+		driver : str
+			Driver for writing the geometries when out is given
+		combine : bool
+			Request featuretypes with the same bounding box, projection
+			and namespace in one POST request (one query per featuretype),
+			when the service supports POST. Only applies to jobs without
+			further arguments. When the combined response is truncated by
+			the feature limit of the service, the featuretypes are
+			requested separately after all
+
+		Returns
+		-------
+		dict
+			wfs20.reader.DataReader per featuretype
+		"""
+
+		jobs = [
+			dict(zip(("featuretype","bbox","epsg"), job)) if isinstance(job, (tuple, list))
+			else dict(job)
+			for job in jobs
+			]
+		names = [job["featuretype"] for job in jobs]
+		# Unconsumed streamed readers would keep occupying the host
+		if any(job.get("stream") for job in jobs):
+			raise WFSInternalError(
+				"Request Error",
+				"Streamed requests are not available in RequestMany, use out to download to file"
+				)
+		if len(set(names)) != len(names):
+			raise WFSInternalError(
+				"Request Error",
+				"Every featuretype can only be requested once per RequestMany"
+				)
+		groups = defaultdict(list)
+		for job in jobs:
+			if combine and self._PostURL() is not None and set(job) == {"featuretype","bbox","epsg"}:
+				key = (job["featuretype"].split(":")[0], tuple(job["bbox"]), job["epsg"])
+			else:
+				key = len(groups)
+			groups[key].append(job)
+
+		def run(group):
+			if len(group) > 1:
+				readers = self._RequestCombined(group)
+				if readers is not None:
+					if out is not None:
+						for reader in readers.values():
+							_WriteGeometries(reader, driver, out, epsg=group[0]["epsg"])
+					return readers
+			if out is None:
+				return {job["featuretype"]:self._Request(**job) for job in group}
+			return {
+				job["featuretype"]:self._Download(out=out, driver=driver, **job)
+				for job in group
+				}
+
+		readers = {}
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			for result in pool.map(run, groups.values()):
+				readers.update(result)
+		return {name:readers[name] for name in names}
+
+	def _RequestCombined(self, group):
+		"""Request the featuretypes of a group of jobs in one POST request
+
+		Returns a DataReader per featuretype, or None when the response
+		is truncated by the feature limit of the service.
+		"""
+
+		featuretypes = [job["featuretype"] for job in group]
+		keywords = []
+		for featuretype in featuretypes:
+			crs, keyword = self._CheckRequest(featuretype, group[0]["epsg"])
+			keywords.append(keyword)
+		limit = self._CountLimit()
+		url, data = CreateMultiPostRequest(
+			self._PostURL(),
+			self.version,
+			featuretypes,
+			group[0]["bbox"],
+			crs,
+			count=limit,
+			)
+		readers = _ReadCombined(
+			url, data, keywords, session=self.Session, cache=self.ResponseCache,
+			timeout=self.Timeout, retry=self.Retry, epsg=group[0]["epsg"]
+			)
+		total = sum(reader.NumberReturned for reader in readers)
+		matched = readers[0].NumberMatched
+		if (matched is not None and total < matched) \
+		or (matched is None and limit is not None and total >= limit):
+			return None
+		for reader in readers:
+			reader.NumberMatched = reader.NumberReturned
+		return dict(zip(featuretypes, readers))
+
+	def Sync(
+		self,
+		featuretype: str,
+		bbox: tuple,
+		epsg: int,
+		index: 'str | wfs20.sync.FeatureIndex',
+		modified: str=None,
+		pagesize: int=None,
+		outputformat: str=None,
+		filter: 'wfs20.filter.Filter'=None,
+		method: str=None,
+		update: bool=True,
+		) -> 'wfs20.sync.Delta':
+		"""Determine the changes of a layer since the previous synchronization
+
+		The features are compared by their gml:id with an index on disk
+		holding a hash of the content of every feature, so every feature
+		needs an identifier (a WFSInternalError is raised otherwise). The first
+		synchronization returns all features as inserted.
+
+		Without a modified property all features are requested (streamed)
+		and compared by their hash. With a modified property (e.g. a last
+		modified date or version number) only a listing of the gml:id's
+		and modified values is requested first. The features of which the
+		value differs from the index are then requested with a filter on
+		the modified property (modified >= the oldest changed value), so
+		that only the changed records are transferred. This requires the
+		modified values of a feature to never decrease.
+
+		Parameters
+		----------
+		featuretype : str
+			Layer to be requested, mostly in the format of 'xxx:xxx'
+		bbox : tuple
+			Bounding box wherein the spatial data lies that is requested,
+			e.g. (x1,y1,x2,y2)
+		epsg : int
+			The projection code of the requested data and the bounding box
+		index : str or wfs20.sync.FeatureIndex
+			Index of the synchronized features, or the path of its sqlite
+			database. The state is kept per featuretype, bounding box,
+			projection, filter and modified property
+		modified : str
+			Name of the property holding the modification time or version
+			of a feature
+		pagesize : int
+			Number of features per request, see RequestData
+		outputformat : str
+			Format of the response, see RequestData
+		filter : wfs20.filter.Filter
+			Expression the features have to satisfy, see RequestData
+		method : str
+			Request method, see RequestData
+		update : bool
+			Apply the changes to the index. When False the changes are
+			returned again by the next synchronization
+
+		Returns
+		-------
+		wfs20.sync.Delta
+			Inserted and updated features and the gml:id's of the
+			deleted features
+		"""
+
+		if not isinstance(index, FeatureIndex):
+			index = FeatureIndex(index)
+		self._CheckRequest(featuretype, epsg)
+		layer = json.dumps(dict(
+			featuretype=featuretype,
+			bbox=list(bbox),
+			epsg=epsg,
+			filter=None if filter is None else filter.ToString(),
+			modified=modified,
+			))
+		known = index.Get(layer)
+		delta = Delta()
+		kwargs = dict(pagesize=pagesize, outputformat=outputformat, method=method)
+
+		def compare(feature, value):
+			h = _FeatureHash(feature)
+			old = known.get(feature.Id)
+			if old is None:
+				delta.Inserted.append(feature)
+			elif old[0] != h:
+				delta.Updated.append(feature)
+			if old != (h, value):
+				delta._State[feature.Id] = (h, value)
+
+		if modified is None:
+			reader = self._Request(featuretype, bbox, epsg, stream=True, filter=filter, **kwargs)
+			values = {}
+			for feature in reader.IterFeatures():
+				values[_FeatureId(feature)] = None
+				compare(feature, None)
+			self._CheckComplete(reader, pagesize)
+		else:
+			name = modified.split(":")[-1]
+			listing = self._Request(
+				featuretype, bbox, epsg, stream=True, filter=filter, properties=[modified], **kwargs
+				)
+			values = {_FeatureId(f):f.Fields.get(name) for f in listing.IterFeatures()}
+			self._CheckComplete(listing, pagesize)
+			changed = {
+				fid for fid, value in values.items()
+				if fid not in known or known[fid][1] != value
+				}
+			if changed:
+				t = listing.LayerMeta.FieldTypes.get(name, str)
+				# Comparable values, datetimes with a timezone are taken in UTC
+				keys = {fid:_ToValue(values[fid], t) for fid in changed}
+				# Without a (valid) modified value all features are requested
+				query = filter
+				if None not in keys.values():
+					oldest = min(changed, key=keys.get)
+					query = PropertyIsGreaterThanOrEqualTo(modified, values[oldest])
+					if filter is not None:
+						query = query & filter
+				reader = self._Request(featuretype, bbox, epsg, stream=True, filter=query, **kwargs)
+				for feature in reader.IterFeatures():
+					if feature.Id in changed:
+						compare(feature, values[feature.Id])
+				self._CheckComplete(reader, pagesize)
+		delta.Deleted = [fid for fid in known if fid not in values]
+		delta.NumberChecked = len(values)
+		if update:
+			index.Apply(layer, delta)
+		return delta
+
+	def _CheckComplete(self, reader, pagesize):
+		"""Raise an error when a (consumed) reader misses matching features
+		"""
+
+		limit = None if self._PageSize(pagesize) is not None else self._CountLimit()
+		if _IsTruncated(reader, limit):
+			raise WFSInternalError(
+				"Synchronizing",
+				"The response is truncated by the feature limit of the service, use a smaller bounding box"
+				)
+
+	def _CheckRequest(self, featuretype, epsg):
+		"""Return the crs and keyword of a request, after validating it
+		"""
+
 		if featuretype not in self.FeatureTypes:
 			raise WFSInternalError(
 				"Request Error", 
@@ -78,21 +831,235 @@ class WebFeatureService:
 				"Request Error", 
 				f"<{epsg}> not in list of available projections (see <class>.FeatureTypeMeta[<id>].CRS)"
 				)
-		url = CreateGetRequest(
-				self.url,
+		return crs, self.FeatureTypeMeta[featuretype].Title
+
+	def _Job(self, featuretype, bbox, crs, keyword, query, **paging):
+		"""Keyword arguments of the DataReader of a single request
+
+		query holds the request method and the optional parameters of
+		the request (see wfs20.request.CreateGetRequest), paging the
+		startindex and count. Without a given method POST is used when
+		the service supports it and the filter holds a geometry or the
+		GET url would be too long.
+		"""
+
+		query = dict(query)
+		method = query.pop("method", None)
+		kwargs = dict(
+			keyword=keyword,
+			outputformat=query.get("outputformat"),
+			properties=query.get("properties"),
+			epsg=int(crs.code),
+			session=self.Session,
+			cache=self.ResponseCache,
+			timeout=self.Timeout,
+			retry=self.Retry,
+			)
+		post = self._PostURL()
+		if method is None and post is not None:
+			if query.get("filter") is not None and _HasGeometry(query["filter"]):
+				method = "POST"
+		if method is None or method.upper() == "GET":
+			url = CreateGetRequest(
+					self.url,
+					self.version,
+					featuretype,
+					bbox,
+					crs,
+					**query,
+					**paging,
+					)
+			if method is not None or post is None or len(url) <= _MAXURL:
+				return dict(url=url, **kwargs)
+		url, data = CreatePostRequest(
+				post or self.url,
 				self.version,
 				featuretype,
 				bbox,
-				crs
+				crs,
+				**query,
+				**paging,
 				)
-		keyword = self.FeatureTypeMeta[featuretype].Title
-		self.DataReader = DataReader(url,keyword)
-		return self.DataReader
+		return dict(url=url, method="POST", data=data, **kwargs)
+
+	def _PostURL(self):
+		"""Url for POST GetFeature requests, None if POST is not supported
+		"""
+
+		meta = getattr(self, "GetFeatureMeta", None)
+		if meta is None:
+			return None
+		return meta.RequestMethods.get("POST")
+
+	def _OutputFormat(self, featuretype, outputformat):
+		"""Return the output format to request, None for the default (gml)
+
+		'auto' selects a json format when the service offers one.
+		"""
+
+		formats = tuple(self.FeatureTypeMeta[featuretype].OutputFormats)
+		if hasattr(self, "GetFeatureMeta"):
+			formats += tuple(getattr(self.GetFeatureMeta, "outputFormat", ()))
+		if outputformat is None:
+			return None
+		if outputformat == "auto":
+			for f in formats:
+				if _IsJSONFormat(f):
+					return f
+			return None
+		if formats and outputformat not in formats:
+			raise WFSInternalError(
+				"Request Error",
+				f"<{outputformat}> not in list of available output formats (see <class>.FeatureTypeMeta[<id>].OutputFormats)"
+				)
+		lower = outputformat.lower()
+		if not (_IsJSONFormat(outputformat) or "gml" in lower or "xml" in lower):
+			raise WFSInternalError(
+				"Request Error",
+				f"<{outputformat}> can not be parsed, only gml and json output formats are supported"
+				)
+		return outputformat
+
+	def _CountLimit(self):
+		"""Maximum number of features per request, if advertised
+		"""
+
+		try:
+			return int(self.Constraints.get("CountDefault"))
+		except (TypeError, ValueError):
+			return None
+
+	def _PageSize(self, pagesize):
+		"""Return the size of a page, or None if paging is not supported
+		"""
+
+		if str(self.Constraints.get("ImplementsResultPaging")).upper() != "TRUE":
+			return None
+		limit = self._CountLimit()
+		if pagesize is None:
+			return limit or _PAGESIZE
+		if limit:
+			return min(pagesize, limit)
+		return pagesize
+
+	def _IterPages(self, featuretype, bbox, crs, keyword, query, pagesize, stream, startindex=0):
+		"""Yield a DataReader per page until all features are fetched
+
+		The next page is only requested once the previous reader is
+		consumed, as a streamed reader knows its size only afterwards.
+		"""
+
+		while True:
+			reader = DataReader(
+				stream=stream,
+				**self._Job(
+					featuretype, bbox, crs, keyword, query,
+					startindex=startindex, count=pagesize
+					),
+				)
+			yield reader
+			n = reader.NumberReturned
+			startindex += n
+			if n == 0:
+				return
+			if reader.NumberMatched is not None:
+				if startindex >= reader.NumberMatched:
+					return
+			elif n < pagesize:
+				return
+
+	def _ReadPagesConcurrent(self, first, featuretype, bbox, crs, keyword, query, pagesize, workers):
+		"""Fetch the pages following the first page in parallel
+
+		When the total number of features is known all pages are requested
+		at once, otherwise batches of pages are requested until a page
+		comes back incomplete.
+		"""
+
+		n = first.NumberReturned
+		matched = first.NumberMatched
+		if n == 0 or (matched is None and n < pagesize):
+			return
+		startindex = n
+		while True:
+			if matched is not None:
+				indices = range(startindex, matched, n)
+			else:
+				indices = range(startindex, startindex + workers * pagesize, pagesize)
+			jobs = [
+				self._Job(
+					featuretype, bbox, crs, keyword, query,
+					startindex=i, count=pagesize
+					)
+				for i in indices
+				]
+			readers = _ReadConcurrent(jobs, workers)
+			for reader in readers:
+				first += reader
+			if matched is not None or any(r.NumberReturned < pagesize for r in readers):
+				return
+			startindex = indices[-1] + pagesize
+
+	def _ReadTiled(self, featuretype, bbox, crs, keyword, query, workers):
+		"""Request the bounding box as a quadtree of tiles below the feature limit
+
+		Every level of tiles is requested (in parallel when workers > 1),
+		the tiles that come back truncated are split in four for the next
+		level. The results are merged without duplicate features.
+		"""
+
+		limit = self._CountLimit()
+		readers = []
+		level = [bbox]
+		depth = 0
+		while level:
+			jobs = [
+				self._Job(featuretype, tile, crs, keyword, query)
+				for tile in level
+				]
+			if workers > 1:
+				results = _ReadConcurrent(jobs, workers)
+			else:
+				results = [DataReader(**kw) for kw in jobs]
+			tiles = []
+			for tile, reader in zip(level, results):
+				truncated = _IsTruncated(reader, limit)
+				if truncated and depth < _MAXDEPTH:
+					tiles += _SplitBBOX(tile)
+					continue
+				if truncated:
+					warnings.warn(
+						f"Tile {tile} is still truncated after {_MAXDEPTH} subdivisions",
+						RuntimeWarning
+						)
+				readers.append(reader)
+			level = tiles
+			depth += 1
+
+		# Merge the tiles, skipping features already seen on a neighbouring tile
+		seen = set()
+		for reader in readers:
+			features = []
+			for f in reader.Features:
+				if f.Id is not None:
+					if f.Id in seen:
+						continue
+					seen.add(f.Id)
+				features.append(f)
+			reader.Features = features
+			reader.NumberReturned = len(features)
+		merged = readers[0]
+		for reader in readers[1:]:
+			merged += reader
+		merged.NumberMatched = merged.NumberReturned
+		return merged
 
 	def ToFile(
 		self,
 		out: str,
 		driver: str="GeoJSON",
+		batchsize: int=_BATCHSIZE,
+		append: bool=False,
 		):
 		"""Write geospatial data held in reader to file
 
@@ -104,9 +1071,15 @@ class WebFeatureService:
 			ogr driver for writing the geometries
 			E.g. 'GeoJSON' if one wants to write the data
 			in the geojson format
+		batchsize : int, optional
+			Number of features written per transaction (when supported
+			by the driver, e.g. 'GPKG')
+		append : bool, optional
+			Append to the layer of an existing file instead of
+			replacing the file
 		"""
 		
 		if self.DataReader == None or not self.DataReader.Features:
 			raise WFSInternalError("Writing to file","No features collected from WebFeatureService")
-		_WriteGeometries(self.DataReader,driver,out)
+		_WriteGeometries(self.DataReader,driver,out,batchsize=batchsize,append=append)
 		
\ No newline at end of file
@@ -0,0 +1,65 @@
+import pytest
+
+ogr = pytest.importorskip("osgeo.ogr")
+
+from wfs20.error import WFSInternalError
+from wfs20.io import _Writer
+from wfs20.util import Feature, LayerMeta
+
+def _Features(start, n):
+	return [
+		Feature.from_geojson({
+			"type": "Feature",
+			"id": f"parcel.{i}",
+			"properties": {"name": f"parcel {i}", "area": i * 1.5},
+			"geometry": {"type": "Point", "coordinates": [155000.0 + i, 463000.0]},
+			})
+		for i in range(start, start + n)
+		]
+
+def _LayerMeta(features):
+	meta = LayerMeta(None, "parcel")
+	for f in features:
+		meta.Update(f)
+	return meta
+
+def _Count(path):
+	source = ogr.Open(str(path))
+	n = source.GetLayerByName("parcel").GetFeatureCount()
+	source = None
+	return n
+
+def test_gpkg_write_append_abort(tmp_path):
+	features = _Features(0, 3)
+	meta = _LayerMeta(features)
+
+	writer = _Writer("GPKG", tmp_path, "parcel", meta)
+	writer.Write(features)
+	writer.Close()
+	assert _Count(writer.Path) == 3
+
+	writer = _Writer("GPKG", tmp_path, "parcel", meta, append=True)
+	writer.Write(_Features(3, 2))
+	writer.Close()
+	assert _Count(writer.Path) == 5
+
+	# The pending batch is rolled back
+	writer = _Writer("GPKG", tmp_path, "parcel", meta, append=True)
+	writer.Write(_Features(5, 2))
+	writer.Abort()
+	assert _Count(writer.Path) == 5
+
+	source = ogr.Open(str(writer.Path))
+	f = source.GetLayerByName("parcel").GetFeature(1)
+	assert f.GetField("name") == "parcel 0"
+	assert f.GetGeometryRef().GetX() == 155000.0
+	source = None
+
+def test_gpkg_mismatching_value(tmp_path):
+	features = _Features(0, 1)
+	writer = _Writer("GPKG", tmp_path, "parcel", _LayerMeta(features))
+	bad = _Features(1, 1)
+	bad[0].Fields["area"] = "unknown"
+	with pytest.raises(WFSInternalError, match="does not match"):
+		writer.Write(bad)
+	writer.Abort()